@@ -5,14 +5,14 @@ import json
 import numpy as np
 import torch
 import easyocr
-import requests
 from ultralytics import YOLO
 from fastapi import FastAPI, File, UploadFile, Request, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, HTMLResponse, FileResponse
 from dotenv import load_dotenv
 from openai import OpenAI
-import mysql.connector
+from services.google_books_client import get_google_books_client
+from services.db_service import book_repository
 
 # =========================================================
 # 🌍 CONFIGURATION GÉNÉRALE
@@ -195,15 +195,12 @@ def search_google_books(query):
     if not GOOGLE_API_KEY or not query.strip():
         return {}
     try:
-        params = {
-            'q': query,
-            'maxResults': 1,
-            'key': GOOGLE_API_KEY,
-            'langRestrict': 'fr'
-        }
-        r = requests.get("https://www.googleapis.com/books/v1/volumes", params=params, timeout=6)
-        r.raise_for_status()
-        data = r.json()
+        data = get_google_books_client().search(
+            query,
+            max_results=1,
+            key=GOOGLE_API_KEY,
+            langRestrict='fr'
+        )
     except Exception as e:
         print(f"⚠ Erreur Google Books : {e}")
         return {}
@@ -222,48 +219,18 @@ def search_google_books(query):
 # =========================================================
 # 🗄️ BASE DE DONNÉES SIMPLE
 # =========================================================
-DB_CONFIG = {
-    "host": "localhost",
-    "user": "root",
-    "password": "",
-    "database": "bibliodb"
-}
-
-def insert_book(golden_record, biblio_id, ligne, col):
+def insert_books(rows):
+    """Insertion groupée (une transaction) : rows = [(golden_record, biblio_id, ligne, col), ...]"""
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-
-        sql = """
-        INSERT INTO livres
-          (biblio_id, titre, auteur, date_pub,
-           position_ligne, position_colonne,
-           couverture_url, isbn)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-        """
-
-        cursor.execute(sql, (
-            biblio_id,
-            golden_record.get("titre"),
-            golden_record.get("auteur"),
-            golden_record.get("date_pub"),
-            ligne,
-            col,
-            golden_record.get("cover"),
-            golden_record.get("isbn"),
-        ))
-
-        conn.commit()
-        print("✅ Livre inséré en BD :", golden_record.get("titre"))
-
+        inserted = book_repository.insert_books(rows)
+        print(f"✅ {len(inserted['ids'])} livre(s) inséré(s) en BD ({inserted['db_time_ms']} ms)")
+        return inserted
     except Exception as e:
         print("❌ Erreur insertion BD :", e)
-    finally:
-        try:
-            cursor.close()
-            conn.close()
-        except:
-            pass
+        return {"ids": [], "db_time_ms": 0.0}
+
+def insert_book(golden_record, biblio_id, ligne, col):
+    insert_books([(golden_record, biblio_id, ligne, col)])
 
 # =========================================================
 # 🔁 PIPELINE PRINCIPAL
@@ -333,6 +300,7 @@ async def scan_and_enrich(
 
     annotated = img.copy()
     out_data = []
+    db_rows = []
 
     for idx, (box, score, cls) in enumerate(detections):
         x1, y1, x2, y2 = map(int, box)
@@ -391,12 +359,7 @@ async def scan_and_enrich(
             "isbn": g.get("isbn")
         }
 
-        insert_book(
-            golden_record=golden_record,
-            biblio_id=biblio_id,
-            ligne=position_ligne,
-            col=position_colonne
-        )
+        db_rows.append((golden_record, biblio_id, position_ligne, position_colonne))
 
         out_data.append({
             "google_books": g,
@@ -407,6 +370,9 @@ async def scan_and_enrich(
     annotated_path = "debug_crops/all_books_detected.jpg"
     cv2.imwrite(annotated_path, annotated)
 
+    # LOAD DB : tous les livres du scan en une seule transaction
+    inserted = insert_books(db_rows)
+
     return JSONResponse({
         "message": "✅ Détection + OCR + Correction + Enrichissement terminés.",
         "books_detected": len(out_data),
@@ -414,6 +380,8 @@ async def scan_and_enrich(
         "biblio_id": biblio_id,
         "position_ligne": position_ligne,
         "position_colonne": position_colonne,
+        "livre_ids": inserted["ids"],
+        "db_time_ms": inserted["db_time_ms"],
         "results": out_data
     })
 
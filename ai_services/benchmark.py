@@ -0,0 +1,250 @@
+"""End-to-end benchmark of the detection -> OCR -> agent -> DB pipeline
+
+Runs a fixed corpus of shelf images through each stage and reports
+throughput and p50/p95/p99 latency per stage:
+    detection   DetectionService.predict (one call per image)
+    ocr         OCRService.predict (one call per book crop)
+    agent       resolve_book_title (one call per OCR text)
+    db          BookRepository.insert_books (one call per book)
+The LLM and Google Books are replaced by a local stub server (fixed,
+configurable latency) and the database by a throw-away SQLite file, so
+runs are reproducible and comparable across backends / machines. The
+resolution cache and the catalogue index are disabled.
+
+Usage:
+    python benchmark.py
+    DETECTION_BACKEND=onnx python benchmark.py --runs 5 --json bench_onnx.json
+    python benchmark.py --stages detection ocr --images "photos/*.jpg"
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Fixed corpus (shelf photos kept by the debug artifacts + the last upload)
+CORPUS = ["debug_crops/original.jpg", "debug_crops/*/original.jpg", "uploaded.jpg"]
+STAGES = ("detection", "ocr", "agent", "db")
+
+
+# =========================================================
+#  STUB LLM (OpenAI chat completions) + GOOGLE BOOKS
+# =========================================================
+class StubHandler(BaseHTTPRequestHandler):
+    llm_latency = 0.0
+    google_latency = 0.0
+
+    def _send(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        """OpenAI-compatible /v1/chat/completions: echoes the OCR text as the title"""
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        ocr_text = prompt.split('OCR Text: "', 1)[-1].split('"', 1)[0]
+        time.sleep(self.llm_latency)
+        self._send({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {
+                    "role": "assistant",
+                    "content": f"Title: {ocr_text}\nReasoning: stub\nConfidence: 0.9",
+                },
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    def do_GET(self):
+        """Google Books volumes search: one volume titled like the query"""
+        query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+        title = query.replace("intitle:", "").strip('"')
+        time.sleep(self.google_latency)
+        self._send({"totalItems": 1, "items": [{"volumeInfo": {
+            "title": title, "authors": ["Stub"], "publishedDate": "2020",
+            "industryIdentifiers": [{"type": "ISBN_13", "identifier": "9780000000000"}],
+        }}]})
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_server(llm_latency_ms, google_latency_ms):
+    StubHandler.llm_latency = llm_latency_ms / 1000
+    StubHandler.google_latency = google_latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# =========================================================
+#  STATS
+# =========================================================
+def percentile(values, q):
+    """Linear-interpolated percentile (q in 0-100) of a non-empty list"""
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def summarize(samples_ms):
+    if not samples_ms:
+        return {"calls": 0}
+    total_s = sum(samples_ms) / 1000
+    return {
+        "calls": len(samples_ms),
+        "throughput_per_s": round(len(samples_ms) / total_s, 2) if total_s else None,
+        "mean_ms": round(sum(samples_ms) / len(samples_ms), 2),
+        "p50_ms": round(percentile(samples_ms, 50), 2),
+        "p95_ms": round(percentile(samples_ms, 95), 2),
+        "p99_ms": round(percentile(samples_ms, 99), 2),
+        "max_ms": round(max(samples_ms), 2),
+    }
+
+
+def _timed(samples, fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    samples.append((time.perf_counter() - started) * 1000)
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+# =========================================================
+#  BENCHMARK
+# =========================================================
+def run(args):
+    import cv2
+    import config
+    from services.db_service import BookRepository
+    from utils.ocr_utils import clean_text
+
+    paths = sorted({p for pattern in args.images for p in glob.glob(pattern)})
+    corpus = [(p, cv2.imread(p)) for p in paths]
+    corpus = [(p, img) for p, img in corpus if img is not None]
+    if not corpus:
+        raise SystemExit(f"❌ Aucune image dans le corpus : {args.images}")
+    print(f" Corpus : {len(corpus)} image(s), {args.runs} passe(s)")
+
+    detector = ocr = None
+    if "detection" in args.stages:
+        from services.detection_service import get_detection_service
+        detector = get_detection_service()
+    if "ocr" in args.stages:
+        from services.ocr_service import get_ocr_service
+        ocr = get_ocr_service()
+    if "agent" in args.stages:
+        from services.agents_service import resolve_book_title
+    if "db" in args.stages:
+        db_path = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE livres (
+                    livre_id INTEGER PRIMARY KEY AUTOINCREMENT, biblio_id INTEGER,
+                    titre TEXT, auteur TEXT, date_pub TEXT, position_ligne INTEGER,
+                    position_colonne INTEGER, couverture_url TEXT, isbn TEXT,
+                    correction_manuelle INTEGER DEFAULT 0
+                )
+                """
+            )
+        repository = BookRepository(connect=lambda: sqlite3.connect(db_path), placeholder="?")
+
+    samples = {stage: [] for stage in STAGES}
+    pipeline = []
+    for run_idx in range(args.warmup + args.runs):
+        warmup = run_idx < args.warmup
+        current = {stage: [] for stage in STAGES} if warmup else samples
+        for _, img in corpus:
+            started = time.perf_counter()
+            boxes = []
+            if detector is not None:
+                result = _timed(current["detection"], detector.predict, img, config.DEFAULT_CONF, config.DEFAULT_IOU)
+                boxes = [tuple(map(int, b)) for b in result.boxes.xyxy.cpu().numpy()]
+            crops = [img[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+            texts = []
+            if ocr is not None:
+                texts = [clean_text(_timed(current["ocr"], ocr.predict, crop)) for crop in crops]
+            titles = [t for t in texts if t] or [f"Livre {i + 1}" for i in range(len(crops))]
+            if "agent" in args.stages:
+                titles = [_timed(current["agent"], resolve_book_title, t).get("resolved_title") or t for t in titles]
+            if "db" in args.stages:
+                for col, title in enumerate(titles, start=1):
+                    _timed(current["db"], repository.insert_books,
+                           [({"titre": title, "auteur": "Stub"}, 1, 1, col)])
+            if not warmup:
+                pipeline.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "environment": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "detection_backend": config.DETECTION_BACKEND,
+            "detection_precision": config.DETECTION_PRECISION,
+            "ocr_precision": config.OCR_PRECISION,
+            "device": str(config.DEVICE),
+        },
+        "corpus": [p for p, _ in corpus],
+        "runs": args.runs,
+        "stub_latency_ms": {"llm": args.llm_latency_ms, "google_books": args.google_latency_ms},
+        "stages": {stage: summarize(samples[stage]) for stage in args.stages},
+        "pipeline_per_image": summarize(pipeline),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", nargs="*", default=CORPUS, help="Images (globs) du corpus")
+    parser.add_argument("--runs", type=int, default=3, help="Passes mesurées sur le corpus")
+    parser.add_argument("--warmup", type=int, default=1, help="Passes de chauffe (non mesurées)")
+    parser.add_argument("--stages", nargs="*", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Latence simulée du LLM stub")
+    parser.add_argument("--google-latency-ms", type=float, default=0.0, help="Latence simulée de Google Books")
+    parser.add_argument("--json", help="Écrit les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    # Stubs and isolation must be in place before config / services are imported
+    stub_url = start_stub_server(args.llm_latency_ms, args.google_latency_ms)
+    os.environ.update({
+        "LLM_PROVIDER": "openai",
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": f"{stub_url}/v1",
+        "OPENAI_API_BASE": f"{stub_url}/v1",
+        "GOOGLE_BOOKS_URL": f"{stub_url}/books/v1/volumes",
+        "GOOGLE_BOOKS_CACHE_MAX_ENTRIES": "1",
+        "RESOLUTION_CACHE_ENABLED": "0",
+        "CATALOGUE_INDEX_ENABLED": "0",
+    })
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Résultats écrits dans {args.json}")
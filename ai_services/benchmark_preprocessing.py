@@ -0,0 +1,111 @@
+"""Latency / accuracy of the OCR crop preprocessing settings on the debug crops
+
+Runs OCRService.predict_batch on the spine crops kept in debug_crops with
+each preprocessing setting (crop height x color mode) and reports, per
+setting, the mean OCR latency per crop, the preprocessing share of it, and
+the character accuracy of the text w.r.t. the reference setting (original
+crop size, colors as is). With --labels (JSON {crop path: expected text})
+the accuracy is measured against the labels instead.
+
+Usage:
+    python benchmark_preprocessing.py
+    python benchmark_preprocessing.py --heights 0 96 128 192 --colors bgr clahe --json prep.json
+    OCR_PRECISION=int8 python benchmark_preprocessing.py --labels labels.json
+"""
+import argparse
+import glob
+import json
+import time
+
+import cv2
+
+import config
+from utils.ocr_utils import clean_text, levenshtein_distance
+from utils.preprocessing import COLOR_MODES, prepare_crops
+
+SPINE_CROPS = ["debug_crops/book_[0-9]*.jpg", "debug_crops/*/book_[0-9]*.jpg"]
+REFERENCE = {"height": None, "color": "bgr"}
+
+
+def _load(patterns):
+    paths = sorted({p for pattern in patterns for p in glob.glob(pattern) if not p.endswith("_ocr.jpg")})
+    crops = [(p, cv2.imread(p)) for p in paths]
+    return [(p, img) for p, img in crops if img is not None]
+
+
+def _char_accuracy(references, texts):
+    errors = sum(levenshtein_distance(ref, hyp) for ref, hyp in zip(references, texts))
+    chars = sum(len(ref) for ref in references)
+    return round(max(0.0, 1 - errors / chars), 4) if chars else 1.0
+
+
+def run_setting(ocr, crop_images, setting, runs):
+    """Mean latency per crop (OCR and preprocessing alone) and texts for one setting"""
+    ocr.preprocessing = setting
+    ocr_ms, prep_ms = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        prepare_crops(crop_images, direction=config.SPINE_TEXT_DIRECTION, **setting)
+        prep_ms.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        results = ocr.predict_batch(crop_images)
+        ocr_ms.append((time.perf_counter() - started) * 1000)
+    count = max(len(crop_images), 1)
+    return {
+        "latency_ms_per_crop": round(sum(ocr_ms) / len(ocr_ms) / count, 2),
+        "preprocessing_ms_per_crop": round(sum(prep_ms) / len(prep_ms) / count, 3),
+    }, [clean_text(r) for r in results]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--crops", nargs="*", default=SPINE_CROPS, help="Globs des crops de tranches")
+    parser.add_argument("--heights", nargs="*", type=int, default=[64, 96, 128, 192],
+                        help="Hauteurs de crop testées (0 = taille d'origine)")
+    parser.add_argument("--colors", nargs="*", choices=COLOR_MODES, default=list(COLOR_MODES))
+    parser.add_argument("--runs", type=int, default=3, help="Passes mesurées par réglage")
+    parser.add_argument("--labels", help="JSON {chemin du crop: texte attendu}")
+    parser.add_argument("--json", help="Écrit les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    from services.ocr_service import OCRService
+
+    crops = _load(args.crops)
+    if not crops:
+        raise SystemExit(f"❌ Aucun crop trouvé : {args.crops}")
+    crop_images = [img for _, img in crops]
+    ocr = OCRService()
+    print(f" {len(crops)} crop(s), OCR {ocr.precision}, réglage actuel : {ocr.preprocessing}")
+
+    # Reference texts: the labels, or the text read on the unresized crops (first setting)
+    reference_texts = None
+    if args.labels:
+        with open(args.labels) as f:
+            labels = json.load(f)
+        crops = [(p, img) for p, img in crops if p in labels]
+        reference_texts = [labels[p] for p, _ in crops]
+        crop_images = [img for _, img in crops]
+    ocr.preprocessing = REFERENCE
+    ocr.predict_batch(crop_images[:1])  # warm-up
+
+    settings = [REFERENCE] + [
+        {"height": height or None, "color": color}
+        for height in args.heights for color in args.colors
+        if (height or None, color) != (None, "bgr")
+    ]
+    report = {"crops": len(crops), "precision": ocr.precision,
+              "reference": "labels" if args.labels else REFERENCE, "settings": []}
+    for setting in settings:
+        stats, texts = run_setting(ocr, crop_images, setting, args.runs)
+        if reference_texts is None:
+            reference_texts = texts
+        stats.update(setting, char_accuracy=_char_accuracy(reference_texts, texts))
+        report["settings"].append(stats)
+        print(f"  height={setting['height']!s:>4} color={setting['color']:<5} "
+              f"{stats['latency_ms_per_crop']:>8.2f} ms/crop  accuracy={stats['char_accuracy']:.4f}")
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Résultats écrits dans {args.json}")
@@ -0,0 +1,67 @@
+"""Check of the OCR pre-filter thresholds on the bundled spine crops
+
+Every spine crop kept in debug_crops must be sent to OCR with the config
+thresholds, while a blank crop (flat color, light JPEG noise) and the same
+crop heavily blurred must be skipped. Exits with status 1 otherwise.
+
+Usage:
+    python check_prefilter.py
+    OCR_MIN_SHARPNESS=8 python check_prefilter.py
+"""
+import argparse
+import glob
+import sys
+
+import cv2
+import numpy as np
+
+import config
+from utils.image_utils import ocr_skip_reason
+
+SPINE_CROPS = ["debug_crops/book_[0-9]*.jpg", "debug_crops/*/book_[0-9]*.jpg"]
+
+
+def _skip_reason(image):
+    return ocr_skip_reason(image, config.OCR_MIN_CROP_SIDE, config.OCR_MAX_CROP_ASPECT,
+                           config.OCR_MIN_SHARPNESS, config.OCR_MIN_EDGE_DENSITY)
+
+
+def _blank_crop(height=124, width=55, noise=2.0):
+    rng = np.random.default_rng(0)
+    flat = np.clip(120 + rng.normal(0, noise, (height, width, 3)), 0, 255).astype(np.uint8)
+    return cv2.imdecode(cv2.imencode(".jpg", flat)[1], cv2.IMREAD_COLOR)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--crops", nargs="*", default=SPINE_CROPS, help="Globs des crops de tranches")
+    args = parser.parse_args()
+
+    paths = sorted({p for pattern in args.crops for p in glob.glob(pattern) if not p.endswith("_ocr.jpg")})
+    crops = [(p, cv2.imread(p)) for p in paths]
+    crops = [(p, img) for p, img in crops if img is not None]
+    if not crops:
+        raise SystemExit(f"❌ Aucun crop trouvé : {args.crops}")
+
+    ok = True
+    for path, image in crops:
+        reason = _skip_reason(image)
+        if reason:
+            ok = False
+            print(f"❌ {path} écarté ({reason})")
+    print(f" {len(crops)} crop(s) de tranche vérifié(s)")
+
+    expected = {
+        "blank": _blank_crop(),
+        "blurry": cv2.GaussianBlur(crops[0][1], (0, 0), 8),
+    }
+    for name, image in expected.items():
+        reason = _skip_reason(image)
+        if reason is None:
+            ok = False
+            print(f"❌ Crop {name} envoyé à l'OCR")
+        else:
+            print(f" Crop {name} écarté ({reason})")
+
+    print("✅ Seuils du pré-filtre OK" if ok else "❌ Seuils du pré-filtre à revoir")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,49 @@
+"""End-to-end check of tiled detection: predict_tiled -> _extract_boxes
+
+Builds a panoramic shelf photo by placing a shelf image side by side with
+itself, runs the tiled detection on it and reads the merged result the way
+the endpoints do (controllers.detection_controller._extract_boxes). Exits
+with status 1 when the merged result cannot be read or finds no book.
+
+Usage:
+    python check_tiling.py
+    python check_tiling.py --image debug_crops/original.jpg --repeat 4
+"""
+import argparse
+import sys
+
+import cv2
+import numpy as np
+
+from controllers.detection_controller import _extract_boxes
+from services.detection_service import DetectionService
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image", default="uploaded.jpg", help="Photo d'étagère de départ")
+    parser.add_argument("--repeat", type=int, default=3, help="Copies côte à côte (image panoramique)")
+    parser.add_argument("--conf", type=float, default=0.6)
+    parser.add_argument("--iou", type=float, default=0.5)
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image)
+    if image is None:
+        raise SystemExit(f"❌ Impossible de lire l'image : {args.image}")
+    panorama = np.ascontiguousarray(np.hstack([image] * args.repeat))
+    if not DetectionService.needs_tiling(panorama):
+        raise SystemExit(f"❌ {panorama.shape[1]}x{panorama.shape[0]} n'est pas découpée en tuiles, augmentez --repeat")
+
+    service = DetectionService()
+    results = service.predict_tiled(panorama, conf=args.conf, iou=args.iou)
+    try:
+        boxes = _extract_boxes(results)
+    except Exception as e:
+        print(f"❌ Résultat tuilé illisible par _extract_boxes : {e!r}")
+        sys.exit(1)
+
+    single = len(service.predict(image, conf=args.conf, iou=args.iou).boxes)
+    lefts = [float(box[0]) for box, _, _ in boxes]
+    ok = len(boxes) > 0 and lefts == sorted(lefts)
+    print(f"{'✅' if ok else '❌'} {len(boxes)} livre(s) sur l'image panoramique "
+          f"({single} sur l'image seule, x{args.repeat})")
+    sys.exit(0 if ok else 1)
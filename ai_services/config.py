@@ -1,6 +1,5 @@
 """Configuration settings for the BiblioScan server"""
 import os
-import torch
 
 # =========================================================
 #  PATHS
@@ -8,8 +7,18 @@ import torch
 MODEL_PATH = "./models/bookshelf_best.pt"
 UPLOAD_PATH = "uploaded.jpg"
 DEBUG_CROPS_DIR = "debug_crops"
-DEBUG_IMG_PATH = f"{DEBUG_CROPS_DIR}/debug_image.jpg"
-ORIGINAL_PATH = f"{DEBUG_CROPS_DIR}/original.jpg"
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+
+# Number of per-request artifact directories kept under DEBUG_CROPS_DIR
+DEBUG_MAX_REQUESTS = int(os.getenv("DEBUG_MAX_REQUESTS", "50"))
+# Debug artifacts policy: "off" (production), "sampled" or "always"
+DEBUG_ARTIFACTS = os.getenv("DEBUG_ARTIFACTS", "always")
+# Fraction of requests captured in "sampled" mode
+DEBUG_ARTIFACTS_SAMPLE_RATE = float(os.getenv("DEBUG_ARTIFACTS_SAMPLE_RATE", "0.05"))
+# Max raw image bytes waiting for the background writer (further requests are not captured)
+DEBUG_ARTIFACTS_MAX_QUEUE_BYTES = int(os.getenv("DEBUG_ARTIFACTS_MAX_QUEUE_BYTES", str(256 * 1024 * 1024)))
+# Annotated views rendered on demand and kept in memory (LRU)
+ANNOTATED_CACHE_SIZE = int(os.getenv("ANNOTATED_CACHE_SIZE", "32"))
 
 # Create debug directory if it doesn't exist
 os.makedirs(DEBUG_CROPS_DIR, exist_ok=True)
@@ -17,12 +26,60 @@ os.makedirs(DEBUG_CROPS_DIR, exist_ok=True)
 # =========================================================
 #  DEVICE CONFIGURATION
 # =========================================================
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+# Resolved on first access (see __getattr__) so importing config does not import torch
+_device = os.getenv("DEVICE")
+
+
+def __getattr__(name):
+    """Lazy module attributes: DEVICE ("cuda" if torch sees a GPU, else "cpu")"""
+    global _device
+    if name == "DEVICE":
+        if _device is None:
+            import torch
+            _device = "cuda" if torch.cuda.is_available() else "cpu"
+        return _device
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # =========================================================
 #  OCR CONFIGURATION
 # =========================================================
 OCR_LANGUAGE = 'fr'  # English (works well for most Latin-based languages)
+# Number of text lines sent to the recognizer in one call (predict_batch)
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "16"))
+# Streaming endpoints: crops read per OCR call, so the agents of the first
+# books start while the next ones are still being read
+STREAM_OCR_CHUNK = int(os.getenv("STREAM_OCR_CHUNK", "4"))
+# Spines are rotated to horizontal reading from their box geometry instead of
+# running PaddleOCR's per-line orientation classifier (OCR_TEXTLINE_ORIENTATION=1
+# turns it back on). Direction of the title on a standing spine:
+# "bottom_to_top" (most French / continental books) or "top_to_bottom" (English)
+SPINE_TEXT_DIRECTION = os.getenv("SPINE_TEXT_DIRECTION", "bottom_to_top")
+OCR_TEXTLINE_ORIENTATION = os.getenv("OCR_TEXTLINE_ORIENTATION", "0") == "1"
+# Lines recognised below this confidence are read again flipped 180° (other convention)
+OCR_FLIP_MIN_CONFIDENCE = float(os.getenv("OCR_FLIP_MIN_CONFIDENCE", "0.7"))
+# Recognizer precision: "fp32" (PaddleOCR default model) or "int8" (quantize_models.py output)
+OCR_PRECISION = os.getenv("OCR_PRECISION", "fp32")
+OCR_REC_INT8_DIR = os.getenv("OCR_REC_INT8_DIR", "./models/ocr_rec_int8")
+# Crop preprocessing before OCR (utils/preprocessing.py), per OCR backend (OCR_PRECISION):
+#   height: upright spine crops are resized to this height (None keeps the original size)
+#   color: "bgr" (as is), "gray" or "clahe" (grayscale + local contrast equalization)
+# See benchmark_preprocessing.py for the latency / accuracy of each setting
+OCR_CROP_HEIGHT = int(os.getenv("OCR_CROP_HEIGHT", "128"))
+OCR_PREPROCESSING = {
+    "fp32": {"height": OCR_CROP_HEIGHT, "color": os.getenv("OCR_CROP_COLOR", "bgr")},
+    "int8": {"height": OCR_CROP_HEIGHT, "color": os.getenv("OCR_CROP_COLOR", "bgr")},
+}
+# Pre-filter of the crops before OCR (utils/image_utils.ocr_skip_reason): a crop
+# too small, too thin, blank or blurred is neither read nor sent to the agents.
+# Sharpness (variance of the Laplacian) and edge density are measured on a copy
+# downscaled to 256 px; see biblioscan_ocr_prefilter_total to tune them. The
+# defaults keep every spine of debug_crops, dull low-contrast ones included
+# (check_prefilter.py)
+OCR_PREFILTER = os.getenv("OCR_PREFILTER", "1") == "1"
+OCR_MIN_CROP_SIDE = int(os.getenv("OCR_MIN_CROP_SIDE", "12"))
+OCR_MAX_CROP_ASPECT = float(os.getenv("OCR_MAX_CROP_ASPECT", "30"))
+OCR_MIN_SHARPNESS = float(os.getenv("OCR_MIN_SHARPNESS", "5"))
+OCR_MIN_EDGE_DENSITY = float(os.getenv("OCR_MIN_EDGE_DENSITY", "0.005"))
 
 # =========================================================
 #  YOLO CONFIGURATION
@@ -30,6 +87,48 @@ OCR_LANGUAGE = 'fr'  # English (works well for most Latin-based languages)
 DEFAULT_CONF = 0.6
 DEFAULT_IOU = 0.5
 DEFAULT_IMGSZ = 640
+# Detection backend: "pytorch" (.pt, eager), "onnx" (ONNX Runtime) or "openvino" (OpenVINO IR)
+DETECTION_BACKEND = os.getenv("DETECTION_BACKEND", "pytorch")
+# Exported models are written next to MODEL_PATH by export_model.py
+DETECTION_MODEL_PATHS = {
+    "pytorch": MODEL_PATH,
+    "onnx": os.path.splitext(MODEL_PATH)[0] + ".onnx",
+    "openvino": os.path.splitext(MODEL_PATH)[0] + "_openvino_model",
+}
+# Detection precision: "fp32" or "int8" (onnx / openvino backends, see quantize_models.py)
+DETECTION_PRECISION = os.getenv("DETECTION_PRECISION", "fp32")
+DETECTION_INT8_MODEL_PATHS = {
+    "onnx": os.path.splitext(MODEL_PATH)[0] + "_int8.onnx",
+    "openvino": os.path.splitext(MODEL_PATH)[0] + "_int8_openvino_model",
+}
+# Tiled detection of panoramic shelf photos: an image at least this elongated
+# (long side / short side) is cut into overlapping tiles along its long axis,
+# detected in one batch, and the boxes are merged across the tile seams
+DETECTION_TILING = os.getenv("DETECTION_TILING", "1") == "1"
+DETECTION_TILING_MIN_ASPECT = float(os.getenv("DETECTION_TILING_MIN_ASPECT", "2.0"))
+DETECTION_TILE_MIN_SIZE = int(os.getenv("DETECTION_TILE_MIN_SIZE", str(DEFAULT_IMGSZ)))
+DETECTION_TILE_OVERLAP = float(os.getenv("DETECTION_TILE_OVERLAP", "0.2"))
+DETECTION_MAX_TILES = int(os.getenv("DETECTION_MAX_TILES", "8"))
+# Boxes of two tiles are the same book above this intersection over the smaller box
+DETECTION_TILE_MERGE_THRESHOLD = float(os.getenv("DETECTION_TILE_MERGE_THRESHOLD", "0.6"))
+# Calibration images for INT8 quantization (shelf photos and spine crops)
+CALIBRATION_IMAGES = os.getenv("CALIBRATION_IMAGES", f"{DEBUG_CROPS_DIR}/*.jpg")
+
+# =========================================================
+#  INFERENCE EXECUTOR
+# =========================================================
+# "thread" (models shared, default) or "process" (one model copy per worker).
+# Threads share one YOLO and one PaddleOCR and each model runs one call at a
+# time, so two workers overlap detection of a scan with OCR of another
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+# Micro-batching of YOLO detection across concurrent requests
+DETECTION_BATCHING = os.getenv("DETECTION_BATCHING", "1") == "1"
+DETECTION_BATCH_MAX_SIZE = int(os.getenv("DETECTION_BATCH_MAX_SIZE", "8"))
+DETECTION_BATCH_MAX_WAIT_MS = float(os.getenv("DETECTION_BATCH_MAX_WAIT_MS", "10"))
+# Models are loaded in the background after startup; until then inference
+# routes answer 503 with this Retry-After (seconds)
+MODEL_LOADING_RETRY_AFTER = int(os.getenv("MODEL_LOADING_RETRY_AFTER", "10"))
 
 # =========================================================
 #  LLM CONFIGURATION (for agents)
@@ -39,4 +138,68 @@ LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
 # Model name (e.g., "gpt-4o-mini" for OpenAI, "llama3.2" for Ollama)
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
 # OpenAI API key (optional, can be set via environment variable)
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
\ No newline at end of file
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+# Maximum number of books resolved concurrently by the agent
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "8"))
+# Shelf-batch resolution: the OCR texts of one image go to the LLM in a single
+# JSON request (split when the estimated tokens exceed the budget) instead of
+# one prompt per book; entries the LLM gets wrong fall back to the per-book agent
+AGENT_SHELF_BATCH = os.getenv("AGENT_SHELF_BATCH", "1") == "1"
+AGENT_SHELF_BATCH_MAX_TOKENS = int(os.getenv("AGENT_SHELF_BATCH_MAX_TOKENS", "4000"))
+
+# =========================================================
+#  RESOLUTION CACHE (OCR text -> resolved title)
+# =========================================================
+RESOLUTION_CACHE_ENABLED = os.getenv("RESOLUTION_CACHE_ENABLED", "1") == "1"
+RESOLUTION_CACHE_PATH = os.getenv("RESOLUTION_CACHE_PATH", f"{CACHE_DIR}/resolutions.sqlite3")
+# Time-to-live of an entry, in seconds (0 = never expires)
+RESOLUTION_CACHE_TTL = int(os.getenv("RESOLUTION_CACHE_TTL", str(30 * 24 * 3600)))
+# Maximum number of entries before LRU eviction (0 = unbounded)
+RESOLUTION_CACHE_MAX_ENTRIES = int(os.getenv("RESOLUTION_CACHE_MAX_ENTRIES", "20000"))
+
+# =========================================================
+#  DATABASE
+# =========================================================
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "user": os.getenv("DB_USER", "root"),
+    "password": os.getenv("DB_PASSWORD", ""),
+    "database": os.getenv("DB_NAME", "bibliodb"),
+}
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+
+# =========================================================
+#  CATALOGUE INDEX (fuzzy match on books already in `livres`)
+# =========================================================
+CATALOGUE_INDEX_ENABLED = os.getenv("CATALOGUE_INDEX_ENABLED", "1") == "1"
+# Minimum similarity (0-1) for a catalogue hit to skip the LLM
+CATALOGUE_MATCH_THRESHOLD = float(os.getenv("CATALOGUE_MATCH_THRESHOLD", "0.8"))
+# Number of trigram candidates re-ranked with the edit distance
+CATALOGUE_CANDIDATES = int(os.getenv("CATALOGUE_CANDIDATES", "10"))
+# Delay (s) before loading the index again after the database was unreachable
+CATALOGUE_RETRY_SECONDS = float(os.getenv("CATALOGUE_RETRY_SECONDS", "30"))
+
+# =========================================================
+#  GOOGLE BOOKS API
+# =========================================================
+GOOGLE_BOOKS_URL = os.getenv("GOOGLE_BOOKS_URL", "https://www.googleapis.com/books/v1/volumes")
+# Optional: the API works without a key for basic searches (lower quota)
+GOOGLE_BOOKS_API_KEY = os.getenv("GOOGLE_API_KEY", "")
+GOOGLE_BOOKS_TIMEOUT = float(os.getenv("GOOGLE_BOOKS_TIMEOUT", "10"))
+GOOGLE_BOOKS_POOL_SIZE = int(os.getenv("GOOGLE_BOOKS_POOL_SIZE", "20"))
+# Response cache: TTL in seconds and max number of queries kept (LRU)
+GOOGLE_BOOKS_CACHE_TTL = int(os.getenv("GOOGLE_BOOKS_CACHE_TTL", str(24 * 3600)))
+GOOGLE_BOOKS_CACHE_MAX_ENTRIES = int(os.getenv("GOOGLE_BOOKS_CACHE_MAX_ENTRIES", "5000"))
+# Retries on 429 / 5xx (Retry-After honoured, else exponential backoff)
+GOOGLE_BOOKS_MAX_RETRIES = int(os.getenv("GOOGLE_BOOKS_MAX_RETRIES", "3"))
+GOOGLE_BOOKS_BACKOFF = float(os.getenv("GOOGLE_BOOKS_BACKOFF", "0.5"))
+GOOGLE_BOOKS_MAX_BACKOFF = float(os.getenv("GOOGLE_BOOKS_MAX_BACKOFF", "30"))
+
+# =========================================================
+#  SHELF STATE (idempotent re-scans)
+# =========================================================
+SHELF_STATE_PATH = os.getenv("SHELF_STATE_PATH", f"{CACHE_DIR}/shelf_state.sqlite3")
+# Max dHash distance (bits out of 64) for a crop to count as unchanged
+SHELF_UNCHANGED_MAX_DISTANCE = int(os.getenv("SHELF_UNCHANGED_MAX_DISTANCE", "4"))
+# Max relative difference of box width / height for a spine to match a stored one
+SPINE_GEOMETRY_TOLERANCE = float(os.getenv("SPINE_GEOMETRY_TOLERANCE", "0.15"))
@@ -1,105 +1,319 @@
 """Detection controller for handling book detection and OCR"""
-from fastapi.responses import FileResponse
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, Response
 import cv2
 import numpy as np
+import asyncio
+import json
 import os
+import time
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
-from services.detection_service import detection_service
-from services.ocr_service import ocr_service
-from services.agents_service import resolve_book_title
+from services.inference_executor import inference_executor
+from services import inference_tasks
+from services import detection_batcher
+from services.agents_service import aresolve_book_titles, aresolve_book_title
+from services.shelf_state import shelf_state, match_spines
+from services.artifact_writer import artifact_writer
+from services.artifact_renderer import artifact_renderer, ANNOTATIONS_FILE
+from services.metrics import timed, observe_stage, ocr_failures, ocr_prefilter, books_processed
 from utils.ocr_utils import clean_text, calculate_confidence, get_confidence_label
+from utils.image_utils import dhash, ocr_skip_reason
+from utils.artifacts import new_request_id, artifact_url, resolve_artifact
 
-async def serve_crop(filename: str):
-    """Serve crop images for debugging"""
-    return FileResponse(os.path.join(config.DEBUG_CROPS_DIR, filename))
+def _extract_boxes(results):
+    """
+    List (box, score, cls) tuples from a YOLO result, in shelf order
 
-async def detect(conf: float = 0.6, iou: float = 0.5):
-    """Detect books in uploaded image"""
-    img = cv2.imread(config.UPLOAD_PATH)
-    results = detection_service.predict(img, conf=conf, iou=iou)
-    
-    annotated = img.copy()
-    for box, score, cls in zip(
+    YOLO returns boxes by confidence; sorting them left to right (top to
+    bottom for a vertical stack) keeps `idx` stable across scans of the
+    same shelf, so it can be used as a column offset.
+    """
+    boxes = list(zip(
         results.boxes.xyxy.cpu().numpy(),
         results.boxes.conf.cpu().numpy(),
         results.boxes.cls.cpu().numpy()
-    ):
-        x1, y1, x2, y2 = map(int, box)
-        label = f"{results.names[int(cls)]} ({score:.2f})"
-        cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 0), 3)
-        cv2.putText(annotated, label, (x1, max(25, y1-10)),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    ))
+    if len(boxes) > 1:
+        centers = np.array([[(b[0] + b[2]) / 2, (b[1] + b[3]) / 2] for b, _, _ in boxes])
+        axis = 1 if np.ptp(centers[:, 1]) > np.ptp(centers[:, 0]) else 0
+        boxes = [boxes[i] for i in np.argsort(centers[:, axis], kind="stable")]
+    return boxes
+
+def _format_text_detections(ocr_result, x1, y1):
+    """Format OCR regions of a book crop, with absolute and crop-relative polygons"""
+    detections = []
+    if ocr_result and 'rec_texts' in ocr_result:
+        rec_texts = ocr_result['rec_texts']
+        rec_scores = ocr_result['rec_scores']
+        rec_polys = ocr_result['rec_polys']
+        
+        for text, score, poly in zip(rec_texts, rec_scores, rec_polys):
+            # Convert to absolute coordinates (add book crop offset to get original image coordinates)
+            bbox_absolute = [[float(poly[i][0]) + x1, float(poly[i][1]) + y1] 
+                            for i in range(len(poly))]
+            # Also keep crop-relative coordinates for reference
+            bbox_crop = [[float(poly[i][0]), float(poly[i][1])] 
+                        for i in range(len(poly))]
+            detections.append({
+                "text": text,
+                "confidence": round(score * 100, 2),
+                "bbox": bbox_absolute,  # Absolute coordinates in original image
+                "bbox_crop": bbox_crop  # Relative coordinates in book crop
+            })
+    return detections
+
+def _load_image(img):
+    """Image passed by the caller, or the last uploaded image (/upload flow)"""
+    if img is None:
+        img = cv2.imread(config.UPLOAD_PATH)
+    if img is None:
+        raise HTTPException(status_code=400, detail="Aucune image uploadée ou image invalide")
+    return img
+
+def _start_request():
+    """Artifact namespace of a request, or None when it is not captured (DEBUG_ARTIFACTS)"""
+    return new_request_id() if artifact_writer.capture() else None
+
+def _save_artifacts(request_id, artifacts, books=(), annotations=None):
+    """
+    Hand the artifacts to the background writer. Annotated views are not
+    drawn here: only their boxes / polygons are stored (ANNOTATIONS_FILE)
+    and they are rendered when requested. If the writer is full everything
+    is dropped and the URLs removed, so the response never points to missing
+    files. Returns the request_id to use for the remaining URLs.
+    """
+    if request_id is None:
+        return None
+    with timed("artifacts"):
+        if annotations:
+            artifacts = dict(artifacts, **{ANNOTATIONS_FILE: json.dumps(annotations)})
+        submitted = artifact_writer.submit(request_id, artifacts)
+    if submitted:
+        return request_id
+    for book in books:
+        book["crop_image"] = None
+        book["crop_image_annotated"] = None
+    return None
+
+def _crop_books(img, boxes):
+    """Crop every book region; returns (crops, artifacts) with the crops saved for debugging"""
+    with timed("crop"):
+        book_crops = []
+        artifacts = {"original.jpg": img}
+        for idx, (box, score, cls) in enumerate(boxes):
+            x1, y1, x2, y2 = map(int, box)
+            book_crop = img[y1:y2, x1:x2]
+            artifacts[f"book_{idx}.jpg"] = book_crop
+            book_crops.append(book_crop)
+    return book_crops, artifacts
+
+async def _run_ocr(book_crops):
+    """Batched OCR of the crops in the inference executor (timed per batch and per book)"""
+    if not book_crops:
+        return []
+    started = time.perf_counter()
+    try:
+        return await inference_executor.run(inference_tasks.ocr_batch, book_crops)
+    except Exception:
+        ocr_failures.inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        observe_stage("ocr", elapsed)
+        for _ in book_crops:
+            observe_stage("ocr_per_book", elapsed / len(book_crops))
+
+async def _run_ocr_if_available(book_crops):
+    """`_run_ocr`, with no OCR result (None per crop) when PaddleOCR is not available"""
+    try:
+        return await _run_ocr(book_crops)
+    except (RuntimeError, AttributeError, Exception) as e:
+        if "not available" in str(e) or not await inference_executor.run(inference_tasks.ocr_available):
+            print(f"⚠️  OCR not available: {e}")
+            return [None] * len(book_crops)
+        raise
+
+def _box_annotation(box, label):
+    return {"bbox": [int(v) for v in box], "label": label}
+
+def _poly_annotation(idx, ocr_result):
+    polys = [np.asarray(p).tolist() for p in (ocr_result or {}).get('rec_polys', [])]
+    return {"source": f"book_{idx}.jpg", "polys": polys}
+
+def _skip_reasons(crops):
+    """{idx: reason} for the crops {idx: crop} the pre-filter keeps out of OCR (config.OCR_PREFILTER)"""
+    if not config.OCR_PREFILTER:
+        return {}
+    with timed("prefilter"):
+        reasons = {
+            idx: ocr_skip_reason(crop, config.OCR_MIN_CROP_SIDE, config.OCR_MAX_CROP_ASPECT,
+                                 config.OCR_MIN_SHARPNESS, config.OCR_MIN_EDGE_DENSITY)
+            for idx, crop in crops.items()
+        }
+    for reason in reasons.values():
+        ocr_prefilter.inc(outcome=reason or "passed")
+    return {idx: reason for idx, reason in reasons.items() if reason}
+
+async def _read_crops(book_crops, indices, run_ocr=_run_ocr_if_available):
+    """
+    Pre-filter, then OCR in one batch, the crops `indices`
+    Returns ({idx: ocr_result} for the crops read, {idx: reason} for the crops skipped)
+    """
+    skipped = _skip_reasons({idx: book_crops[idx] for idx in indices})
+    to_ocr = [idx for idx in indices if idx not in skipped]
+    return dict(zip(to_ocr, await run_ocr([book_crops[idx] for idx in to_ocr]))), skipped
+
+def _agent_outcome(idx, cleaned_text, agent_result, skipped=None):
+    """Agent result of a book: the resolution, or a fallback when it raised / there was no text"""
+    if not cleaned_text:
+        return {
+            "resolved_title": "",
+            "confidence": 0.0,
+            "reasoning": f"OCR skipped: {skipped}" if skipped else "No OCR text to resolve"
+        }
+    if isinstance(agent_result, Exception):
+        print(f"⚠️  Error in agent resolution for book {idx}: {agent_result}")
+        return {
+            "resolved_title": cleaned_text,
+            "confidence": 0.0,
+            "reasoning": f"Agent error: {str(agent_result)}"
+        }
+    return agent_result
+
+def _agent_book_info(idx, box, score, class_name, ocr_result, cleaned_text, agent_result, request_id,
+                     skipped=None):
+    """Response entry of one book: detection, OCR and agent result"""
+    x1, y1, x2, y2 = map(int, box)
+    avg_confidence = calculate_confidence(ocr_result) if ocr_result else 0.0
+    detections = _format_text_detections(ocr_result, x1, y1)
+    return {
+        "book_id": idx,
+        "bbox": [x1, y1, x2, y2],
+        "detection_confidence": float(score),
+        "class": class_name,
+        "text": cleaned_text,  # Original OCR text
+        "ocr_confidence": round(avg_confidence * 100, 2) if ocr_result else 0.0,
+        "ocr_quality": get_confidence_label(avg_confidence),
+        "num_text_detections": len(detections),
+        "text_detections": detections,
+        "crop_image": artifact_url(request_id, f"book_{idx}.jpg"),
+        "crop_image_annotated": artifact_url(request_id, f"book_{idx}_ocr.jpg"),
+        "ocr_skipped": skipped,
+        # Agent results (LangGraph LLM agent + Google Books verification)
+        "resolved_title": agent_result.get("resolved_title", ""),
+        "agent_confidence": round(agent_result.get("confidence", 0.0) * 100, 2),
+        "agent_reasoning": agent_result.get("reasoning", ""),
+        "google_books_found": agent_result.get("google_books_found", False),
+        "google_books_info": agent_result.get("google_books_info"),
+        "google_books_verification": agent_result.get("google_books_verification", ""),
+    }
+
+def _annotate_book(annotations, idx, box, ocr_result, display_text):
+    """Add a book to the annotated views: labelled box on the shelf, OCR regions on its crop"""
+    label = f"Book {idx}: {display_text[:30]}..." if display_text else f"Book {idx}"
+    annotations["all_books_detected.jpg"]["boxes"].append(_box_annotation(box, label))
+    annotations[f"book_{idx}_ocr.jpg"] = _poly_annotation(idx, ocr_result)
+
+def _parse_range(header, size):
+    """(start, end) of a single "bytes=a-b" range, None if absent/unsupported"""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start, _, end = header[len("bytes="):].partition("-")
+    try:
+        if start == "":
+            start, end = max(0, size - int(end)), size - 1
+        else:
+            start, end = int(start), min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        return None
+    return (start, end) if start <= end < size else None
+
+async def serve_crop(filename: str, request=None):
+    """Serve debug images: files as is, annotated views rendered on demand (ETag + Range)"""
+    path = resolve_artifact(filename)
+    if path is not None:
+        return FileResponse(path)
+
+    rendered = await asyncio.to_thread(artifact_renderer.render, filename)
+    if rendered is None:
+        raise HTTPException(status_code=404, detail="Fichier introuvable")
+    data, etag = rendered
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private, max-age=3600"}
+    if request is None:
+        return Response(data, media_type="image/jpeg", headers=headers)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    byte_range = _parse_range(request.headers.get("range"), len(data))
+    if byte_range is None:
+        return Response(data, media_type="image/jpeg", headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+    return Response(data[start:end + 1], status_code=206, media_type="image/jpeg", headers=headers)
+
+async def detect(conf: float = 0.6, iou: float = 0.5, img=None):
+    """Detect books in an image (defaults to the last uploaded image)"""
+    img = _load_image(img)
+    request_id = _start_request()
+    with timed("yolo"):
+        results = await detection_batcher.detect(img, conf=conf, iou=iou)
     
-    cv2.imwrite(config.DEBUG_IMG_PATH, annotated)
+    boxes = [
+        _box_annotation(box, f"{results.names[int(cls)]} ({score:.2f})")
+        for box, score, cls in _extract_boxes(results)
+    ]
+    request_id = _save_artifacts(request_id, {"original.jpg": img}, annotations={
+        "debug_image.jpg": {"source": "original.jpg", "boxes": boxes}
+    })
     return {
         "num_books": len(results.boxes),
-        "original_image": "/debug_crops/original.jpg",
-        "annotated_image": "/debug_crops/debug_image.jpg"
+        "original_image": artifact_url(request_id, "original.jpg"),
+        "annotated_image": artifact_url(request_id, "debug_image.jpg")
     }
 
-async def detect_and_ocr(conf: float = 0.6, iou: float = 0.5):
+async def detect_and_ocr(conf: float = 0.6, iou: float = 0.5, img=None):
     """Detect books with YOLO and run OCR on each detected book individually"""
-    img = cv2.imread(config.UPLOAD_PATH)
+    img = _load_image(img)
+    request_id = _start_request()
     
     # Run YOLO detection
-    results = detection_service.predict(img, conf=conf, iou=iou)
+    with timed("yolo"):
+        results = await detection_batcher.detect(img, conf=conf, iou=iou)
     
     if len(results.boxes) == 0:
+        request_id = _save_artifacts(request_id, {"original.jpg": img})
         return {
             "num_books": 0,
             "books": [],
-            "annotated_image": None
+            "annotated_image": None,
+            "original_image": artifact_url(request_id, "original.jpg")
         }
     
     books_data = []
-    annotated = img.copy()
+    boxes = _extract_boxes(results)
+    annotations = {"all_books_detected.jpg": {"source": "original.jpg", "boxes": []}}
+    
+    # Crop every book region (crops saved for debugging with the other artifacts)
+    book_crops, artifacts = _crop_books(img, boxes)
+    
+    # Run OCR on all books at once (batched recognition), except the crops not worth it
+    ocr_results, skipped = await _read_crops(book_crops, range(len(book_crops)), _run_ocr)
+    ocr_batch = [ocr_results.get(idx) for idx in range(len(book_crops))]
     
     # Process each detected book
-    for idx, (box, score, cls) in enumerate(zip(
-        results.boxes.xyxy.cpu().numpy(),
-        results.boxes.conf.cpu().numpy(),
-        results.boxes.cls.cpu().numpy()
-    )):
+    for idx, ((box, score, cls), book_crop, ocr_result) in enumerate(
+        zip(boxes, book_crops, ocr_batch)
+    ):
         x1, y1, x2, y2 = map(int, box)
         
-        # Crop the book region
-        book_crop = img[y1:y2, x1:x2]
-        
-        # Save crop for debugging
-        crop_path = f"{config.DEBUG_CROPS_DIR}/book_{idx}.jpg"
-        cv2.imwrite(crop_path, book_crop)
-        
-        # Run OCR on this specific book
-        ocr_results = ocr_service.predict(book_crop)
-        ocr_result = ocr_results[0] if ocr_results and len(ocr_results) > 0 else None
-        
         # Process OCR results for this book
         cleaned_text = clean_text(ocr_result) if ocr_result else ""
         avg_confidence = calculate_confidence(ocr_result) if ocr_result else 0.0
         quality = get_confidence_label(avg_confidence)
         
         # Format detections for this book
-        detections = []
-        if ocr_result and 'rec_texts' in ocr_result:
-            rec_texts = ocr_result['rec_texts']
-            rec_scores = ocr_result['rec_scores']
-            rec_polys = ocr_result['rec_polys']
-            
-            for text, score, poly in zip(rec_texts, rec_scores, rec_polys):
-                # Convert to absolute coordinates (add book crop offset to get original image coordinates)
-                bbox_absolute = [[float(poly[i][0]) + x1, float(poly[i][1]) + y1] 
-                                for i in range(len(poly))]
-                # Also keep crop-relative coordinates for reference
-                bbox_crop = [[float(poly[i][0]), float(poly[i][1])] 
-                            for i in range(len(poly))]
-                detections.append({
-                    "text": text,
-                    "confidence": round(score * 100, 2),
-                    "bbox": bbox_absolute,  # Absolute coordinates in original image
-                    "bbox_crop": bbox_crop  # Relative coordinates in book crop
-                })
+        detections = _format_text_detections(ocr_result, x1, y1)
         
         # Store book data
         book_info = {
@@ -112,180 +326,220 @@ async def detect_and_ocr(conf: float = 0.6, iou: float = 0.5):
             "ocr_quality": quality,
             "num_text_detections": len(detections),
             "text_detections": detections,
-            "crop_image": f"/debug_crops/book_{idx}.jpg"
+            "crop_image": artifact_url(request_id, f"book_{idx}.jpg"),
+            "ocr_skipped": skipped.get(idx),
         }
         books_data.append(book_info)
         
-        # Draw on annotated image
-        cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 0), 3)
-        label = f"Book {idx}: {cleaned_text[:20]}..." if cleaned_text else f"Book {idx}"
-        cv2.putText(annotated, label, (x1, max(25, y1-10)),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        
-        # Also draw OCR regions on the crop
-        book_crop_annotated = book_crop.copy()
-        if ocr_result and 'rec_polys' in ocr_result:
-            rec_polys = ocr_result['rec_polys']
-            for poly in rec_polys:
-                # poly is already a numpy array with shape (4, 2)
-                points = poly.astype(np.int32)
-                cv2.polylines(book_crop_annotated, [points], True, (0, 255, 0), 2)
+        book_info["crop_image_annotated"] = artifact_url(request_id, f"book_{idx}_ocr.jpg")
         
-        crop_annotated_path = f"{config.DEBUG_CROPS_DIR}/book_{idx}_ocr.jpg"
-        cv2.imwrite(crop_annotated_path, book_crop_annotated)
-        book_info["crop_image_annotated"] = f"/debug_crops/book_{idx}_ocr.jpg"
+        # Annotated views (rendered on demand): book box + OCR regions on the crop
+        label = f"Book {idx}: {cleaned_text[:20]}..." if cleaned_text else f"Book {idx}"
+        annotations["all_books_detected.jpg"]["boxes"].append(_box_annotation((x1, y1, x2, y2), label))
+        annotations[f"book_{idx}_ocr.jpg"] = _poly_annotation(idx, ocr_result)
     
-    # Save overall annotated image
-    annotated_path = f"{config.DEBUG_CROPS_DIR}/all_books_detected.jpg"
-    cv2.imwrite(annotated_path, annotated)
+    # Queue all artifacts for the background writer
+    request_id = _save_artifacts(request_id, artifacts, books_data, annotations)
     
     return {
         "num_books": len(results.boxes),
         "books": books_data,
-        "annotated_image": "/debug_crops/all_books_detected.jpg",
-        "original_image": "/debug_crops/original.jpg"
+        "annotated_image": artifact_url(request_id, "all_books_detected.jpg"),
+        "original_image": artifact_url(request_id, "original.jpg")
     }
 
-async def detect_and_ocr_and_agent(conf: float = 0.6, iou: float = 0.5):
-    """Detect books with YOLO, run OCR on each book, and resolve titles using agents"""
-    img = cv2.imread(config.UPLOAD_PATH)
+async def detect_and_ocr_and_agent(conf: float = 0.6, iou: float = 0.5, img=None, shelf=None):
+    """
+    Detect books with YOLO, run OCR on each book, and resolve titles using agents
+
+    shelf: optional {"biblio_id", "ligne", "col"}. Spines already seen on the
+    last scan of this shelf row (see match_spines) reuse the stored OCR and
+    agent result ("cached"); "unchanged" when still at the same position.
+    """
+    img = _load_image(img)
+    request_id = _start_request()
     
     # Run YOLO detection
-    results = detection_service.predict(img, conf=conf, iou=iou)
+    with timed("yolo"):
+        results = await detection_batcher.detect(img, conf=conf, iou=iou)
     
     if len(results.boxes) == 0:
+        request_id = _save_artifacts(request_id, {"original.jpg": img})
         return {
             "num_books": 0,
             "books": [],
-            "annotated_image": None
+            "annotated_image": None,
+            "original_image": artifact_url(request_id, "original.jpg")
         }
     
     books_data = []
-    annotated = img.copy()
+    boxes = _extract_boxes(results)
+    annotations = {"all_books_detected.jpg": {"source": "original.jpg", "boxes": []}}
+    
+    # Crop every book region (crops saved for debugging with the other artifacts)
+    book_crops, artifacts = _crop_books(img, boxes)
+    with timed("crop"):
+        crop_hashes = [dhash(crop) for crop in book_crops]
+        crop_sizes = [(crop.shape[1], crop.shape[0]) for crop in book_crops]
+    
+    # Spines already seen on the last scan of this shelf row
+    previous, stored = {}, {}
+    if shelf is not None:
+        stored = await asyncio.to_thread(shelf_state.get_row, shelf["biblio_id"], shelf["ligne"])
+        previous = match_spines(stored, crop_hashes, crop_sizes)
+    
+    # Run OCR on the new spines at once (batched recognition), except the crops not worth it
+    fresh, skipped = await _read_crops(book_crops, [idx for idx in range(len(book_crops)) if idx not in previous])
+    ocr_batch = [previous[idx]["ocr_result"] if idx in previous else fresh.get(idx) for idx in range(len(book_crops))]
+    
+    # Resolve all titles concurrently (only books with OCR text)
+    cleaned_texts = [clean_text(ocr_result) if ocr_result else "" for ocr_result in ocr_batch]
+    texts_to_resolve = [text for idx, text in enumerate(cleaned_texts) if text and idx not in previous]
+    try:
+        # aresolve_book_titles will use config defaults if not provided
+        agent_results = await aresolve_book_titles(texts_to_resolve) if texts_to_resolve else []
+    except Exception as e:
+        agent_results = [e] * len(texts_to_resolve)
+    agent_results = iter(agent_results)
+    resolved = []
     
     # Process each detected book
-    for idx, (box, score, cls) in enumerate(zip(
-        results.boxes.xyxy.cpu().numpy(),
-        results.boxes.conf.cpu().numpy(),
-        results.boxes.cls.cpu().numpy()
-    )):
-        x1, y1, x2, y2 = map(int, box)
-        
-        # Crop the book region
-        book_crop = img[y1:y2, x1:x2]
-        
-        # Save crop for debugging
-        crop_path = f"{config.DEBUG_CROPS_DIR}/book_{idx}.jpg"
-        cv2.imwrite(crop_path, book_crop)
-        
-        # Run OCR on this specific book
-        try:
-            ocr_results = ocr_service.predict(book_crop)
-            ocr_result = ocr_results[0] if ocr_results and len(ocr_results) > 0 else None
-        except (RuntimeError, AttributeError, Exception) as e:
-            if "not available" in str(e) or (hasattr(ocr_service, '_available') and not ocr_service._available):
-                print(f"⚠️  OCR not available for book {idx}: {e}")
-                ocr_result = None
-            else:
-                raise
-        
-        # Process OCR results for this book
-        cleaned_text = clean_text(ocr_result) if ocr_result else ""
-        avg_confidence = calculate_confidence(ocr_result) if ocr_result else 0.0
-        quality = get_confidence_label(avg_confidence)
-        
-        # Run agent to resolve book title
-        agent_result = None
-        if cleaned_text:
-            try:
-                # resolve_book_title will use config defaults if not provided
-                agent_result = resolve_book_title(cleaned_text)
-            except Exception as e:
-                print(f"⚠️  Error in agent resolution for book {idx}: {e}")
-                agent_result = {
-                    "resolved_title": cleaned_text,
-                    "confidence": 0.0,
-                    "reasoning": f"Agent error: {str(e)}"
-                }
+    for idx, ((box, score, cls), ocr_result, cleaned_text) in enumerate(zip(boxes, ocr_batch, cleaned_texts)):
+        # Agent result for this book
+        books_processed.inc(outcome="cached" if idx in previous else "skipped" if idx in skipped
+                            else "resolved" if cleaned_text else "no_text")
+        if idx in previous:
+            agent_result = previous[idx]["agent_result"]
         else:
-            agent_result = {
-                "resolved_title": "",
-                "confidence": 0.0,
-                "reasoning": "No OCR text to resolve"
-            }
-        
-        # Format detections for this book
-        detections = []
-        if ocr_result and 'rec_texts' in ocr_result:
-            rec_texts = ocr_result['rec_texts']
-            rec_scores = ocr_result['rec_scores']
-            rec_polys = ocr_result['rec_polys']
-            
-            for text, score, poly in zip(rec_texts, rec_scores, rec_polys):
-                # Convert to absolute coordinates (add book crop offset to get original image coordinates)
-                bbox_absolute = [[float(poly[i][0]) + x1, float(poly[i][1]) + y1] 
-                                for i in range(len(poly))]
-                # Also keep crop-relative coordinates for reference
-                bbox_crop = [[float(poly[i][0]), float(poly[i][1])] 
-                            for i in range(len(poly))]
-                detections.append({
-                    "text": text,
-                    "confidence": round(score * 100, 2),
-                    "bbox": bbox_absolute,  # Absolute coordinates in original image
-                    "bbox_crop": bbox_crop  # Relative coordinates in book crop
-                })
+            agent_result = _agent_outcome(idx, cleaned_text, next(agent_results) if cleaned_text else None,
+                                          skipped.get(idx))
         
         # Store book data with agent results
-        book_info = {
-            "book_id": idx,
-            "bbox": [int(x1), int(y1), int(x2), int(y2)],
-            "detection_confidence": float(score),
-            "class": results.names[int(cls)],
-            "text": cleaned_text,  # Original OCR text
-            "ocr_confidence": round(avg_confidence * 100, 2) if ocr_result else 0.0,
-            "ocr_quality": quality,
-            "num_text_detections": len(detections),
-            "text_detections": detections,
-            "crop_image": f"/debug_crops/book_{idx}.jpg",
-            # Agent results (LangGraph LLM agent + Google Books verification)
-            "resolved_title": agent_result.get("resolved_title", ""),
-            "agent_confidence": round(agent_result.get("confidence", 0.0) * 100, 2),
-            "agent_reasoning": agent_result.get("reasoning", ""),
-            "google_books_found": agent_result.get("google_books_found", False),
-            "google_books_info": agent_result.get("google_books_info"),
-            "google_books_verification": agent_result.get("google_books_verification", ""),
-        }
+        book_info = _agent_book_info(idx, box, score, results.names[int(cls)], ocr_result, cleaned_text,
+                                     agent_result, request_id, skipped.get(idx))
+        book_info["cached"] = idx in previous
+        book_info["unchanged"] = idx in previous and previous[idx]["position_colonne"] == shelf["col"] + idx
         books_data.append(book_info)
+        resolved.append(agent_result)
         
-        # Draw on annotated image with resolved title
-        cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 0), 3)
-        # Use resolved title if available, otherwise use OCR text
-        display_text = agent_result.get("resolved_title", "") or cleaned_text
-        label = f"Book {idx}: {display_text[:30]}..." if display_text else f"Book {idx}"
-        cv2.putText(annotated, label, (x1, max(25, y1-10)),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        
-        # Also draw OCR regions on the crop
-        book_crop_annotated = book_crop.copy()
-        if ocr_result and 'rec_polys' in ocr_result:
-            rec_polys = ocr_result['rec_polys']
-            for poly in rec_polys:
-                # poly is already a numpy array with shape (4, 2)
-                points = poly.astype(np.int32)
-                cv2.polylines(book_crop_annotated, [points], True, (0, 255, 0), 2)
-        
-        crop_annotated_path = f"{config.DEBUG_CROPS_DIR}/book_{idx}_ocr.jpg"
-        cv2.imwrite(crop_annotated_path, book_crop_annotated)
-        book_info["crop_image_annotated"] = f"/debug_crops/book_{idx}_ocr.jpg"
+        # Annotated views (rendered on demand), labelled with the resolved title if available
+        _annotate_book(annotations, idx, box, ocr_result, agent_result.get("resolved_title", "") or cleaned_text)
     
-    # Save overall annotated image
-    annotated_path = f"{config.DEBUG_CROPS_DIR}/all_books_detected.jpg"
-    cv2.imwrite(annotated_path, annotated)
+    # Queue all artifacts for the background writer
+    request_id = _save_artifacts(request_id, artifacts, books_data, annotations)
     
     return {
         "num_books": len(results.boxes),
         "books": books_data,
-        "annotated_image": "/debug_crops/all_books_detected.jpg",
-        "original_image": "/debug_crops/original.jpg"
+        "annotated_image": artifact_url(request_id, "all_books_detected.jpg"),
+        "original_image": artifact_url(request_id, "original.jpg"),
+        # Per-book state for the shelf store (used by scan_and_enrich)
+        "spines": [
+            {"crop_hash": crop_hash, "width": width, "height": height,
+             "ocr_result": ocr_result, "agent_result": agent_result}
+            for crop_hash, (width, height), ocr_result, agent_result
+            in zip(crop_hashes, crop_sizes, ocr_batch, resolved)
+        ],
+        "previous_spines": {
+            idx: {"position_colonne": entry["position_colonne"], "livre_id": entry["livre_id"]}
+            for idx, entry in previous.items()
+        },
+        "removed_spines": [
+            {
+                "position_colonne": col,
+                "livre_id": entry["livre_id"],
+                "resolved_title": entry["agent_result"].get("resolved_title", ""),
+            }
+            for col, entry in sorted(stored.items())
+            if col not in {e["position_colonne"] for e in previous.values()}
+        ],
     }
 
+async def stream_detect_and_ocr_and_agent(conf: float = 0.6, iou: float = 0.5, img=None):
+    """
+    Streaming variant of detect_and_ocr_and_agent: async generator of (event, data)
+        "detection"  as soon as YOLO is done: number of books and their boxes
+        "book"       one per book when its OCR and agent resolution are done,
+                     in completion order (same fields as the books of the
+                     non-streaming response)
+        "done"       once every book was sent: annotated image URL
+    OCR runs on chunks of config.STREAM_OCR_CHUNK crops and each book is
+    handed to the agent as soon as its chunk is read.
+    """
+    img = _load_image(img)
+    request_id = _start_request()
+    
+    with timed("yolo"):
+        results = await detection_batcher.detect(img, conf=conf, iou=iou)
+    boxes = _extract_boxes(results) if len(results.boxes) else []
+    
+    # Crops are queued right away: the book events point to them
+    book_crops, artifacts = _crop_books(img, boxes)
+    request_id = _save_artifacts(request_id, artifacts)
+    yield "detection", {
+        "num_books": len(boxes),
+        "boxes": [
+            {"book_id": idx, "bbox": [int(v) for v in box], "detection_confidence": float(score),
+             "class": results.names[int(cls)]}
+            for idx, (box, score, cls) in enumerate(boxes)
+        ],
+        "original_image": artifact_url(request_id, "original.jpg"),
+    }
+    if not boxes:
+        yield "done", {"num_books": 0, "annotated_image": None}
+        return
+    
+    # (idx, ocr_result, cleaned_text, agent result or exception, skip reason), or the exception that stopped the OCR
+    finished = asyncio.Queue()
+    semaphore = asyncio.Semaphore(config.AGENT_MAX_CONCURRENCY)
+    agent_tasks = []
+    
+    async def resolve(idx, ocr_result, cleaned_text):
+        try:
+            async with semaphore:
+                agent_result = await aresolve_book_title(cleaned_text)
+        except Exception as e:
+            agent_result = e
+        finished.put_nowait((idx, ocr_result, cleaned_text, agent_result, None))
+    
+    async def read_spines():
+        try:
+            for start in range(0, len(book_crops), config.STREAM_OCR_CHUNK):
+                chunk = range(start, min(start + config.STREAM_OCR_CHUNK, len(book_crops)))
+                fresh, skipped = await _read_crops(book_crops, chunk)
+                for idx in chunk:
+                    ocr_result = fresh.get(idx)
+                    cleaned_text = clean_text(ocr_result) if ocr_result else ""
+                    if cleaned_text:
+                        agent_tasks.append(asyncio.create_task(resolve(idx, ocr_result, cleaned_text)))
+                    else:
+                        finished.put_nowait((idx, ocr_result, "", None, skipped.get(idx)))
+        except Exception as e:
+            finished.put_nowait(e)
+    
+    reader = asyncio.create_task(read_spines())
+    annotations = {"all_books_detected.jpg": {"source": "original.jpg", "boxes": []}}
+    try:
+        for _ in boxes:
+            item = await finished.get()
+            if isinstance(item, Exception):
+                raise item
+            idx, ocr_result, cleaned_text, agent_result, skipped = item
+            box, score, cls = boxes[idx]
+            books_processed.inc(outcome="skipped" if skipped else "resolved" if cleaned_text else "no_text")
+            agent_result = _agent_outcome(idx, cleaned_text, agent_result, skipped)
+            _annotate_book(annotations, idx, box, ocr_result, agent_result.get("resolved_title", "") or cleaned_text)
+            yield "book", _agent_book_info(idx, box, score, results.names[int(cls)], ocr_result, cleaned_text,
+                                           agent_result, request_id, skipped)
+    finally:
+        # Client gone or OCR failed: stop the work still running for this scan
+        reader.cancel()
+        for task in agent_tasks:
+            task.cancel()
+    
+    # Annotated views of the whole scan (the crops were queued above)
+    request_id = _save_artifacts(request_id, {}, annotations=annotations)
+    yield "done", {
+        "num_books": len(boxes),
+        "annotated_image": artifact_url(request_id, "all_books_detected.jpg"),
+    }
@@ -1,17 +1,30 @@
 """Upload controller for handling image uploads"""
-from fastapi import File, UploadFile
+from fastapi import File, UploadFile, HTTPException
 import cv2
+import numpy as np
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from services.metrics import timed
+
+def decode_image(content: bytes):
+    """Decode uploaded image bytes in memory (BGR array, like cv2.imread)"""
+    img = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise HTTPException(status_code=400, detail="Image invalide")
+    return img
+
+async def read_image(file: UploadFile = File(...)):
+    """Read an uploaded image straight into memory, without touching the disk"""
+    content = await file.read()
+    with timed("decode"):
+        return decode_image(content)
 
 async def upload_image(file: UploadFile = File(...)):
-    """Handle image upload"""
+    """Handle image upload (kept on disk for the /upload -> /detect flow)"""
     content = await file.read()
+    decode_image(content)
     with open(config.UPLOAD_PATH, "wb") as f:
         f.write(content)
-    img = cv2.imread(config.UPLOAD_PATH)
-    cv2.imwrite(config.ORIGINAL_PATH, img)
     return {"message": " Image uploadée avec succès", "path": config.UPLOAD_PATH}
-
@@ -0,0 +1,117 @@
+"""Accuracy gate for the INT8 models: FP32 vs INT8 on a fixed image set
+
+Reports detection box recall (INT8 boxes matching the FP32 boxes) and OCR
+character accuracy (INT8 text vs FP32 text on the spine crops), plus mean
+latency. Exits with status 1 when a metric falls below its threshold, so
+the INT8 models are only adopted when accuracy holds.
+
+Usage:
+    python evaluate_quantization.py --backend onnx
+    python evaluate_quantization.py --backend openvino --skip-ocr --json results.json
+"""
+import argparse
+import glob
+import json
+import sys
+import time
+
+import cv2
+
+from utils.image_utils import box_iou
+from utils.ocr_utils import clean_text, levenshtein_distance
+
+# Fixed evaluation set
+SHELF_IMAGES = ["debug_crops/original.jpg", "uploaded.jpg"]
+SPINE_CROPS = "debug_crops/book_[0-9]*.jpg"
+
+
+def _load(patterns):
+    paths = sorted({p for pattern in patterns for p in glob.glob(pattern) if not p.endswith("_ocr.jpg")})
+    images = [(p, cv2.imread(p)) for p in paths]
+    return [(p, img) for p, img in images if img is not None]
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def evaluate_detection(backend, images, min_iou):
+    """Box recall of the INT8 detector w.r.t. the FP32 detector (same backend)"""
+    from services.detection_service import DetectionService
+
+    services = {p: DetectionService(backend=backend, precision=p) for p in ("fp32", "int8")}
+    matched = total = 0
+    latency = {"fp32": [], "int8": []}
+    for _, img in images:
+        boxes = {}
+        for precision, service in services.items():
+            result, ms = _timed(service.predict, img)
+            latency[precision].append(ms)
+            boxes[precision] = result.boxes.xyxy.cpu().numpy().tolist()
+        used = set()
+        for ref in boxes["fp32"]:
+            total += 1
+            candidates = [(box_iou(ref, b), j) for j, b in enumerate(boxes["int8"]) if j not in used]
+            best = max(candidates, default=(0.0, None))
+            if best[0] >= min_iou:
+                used.add(best[1])
+                matched += 1
+    return {
+        "images": len(images),
+        "reference_boxes": total,
+        "box_recall": round(matched / total, 4) if total else 1.0,
+        "latency_ms": {p: round(sum(v) / len(v), 2) if v else 0.0 for p, v in latency.items()},
+    }
+
+
+def evaluate_ocr(crops):
+    """Character accuracy of the INT8 recognizer w.r.t. the FP32 recognizer"""
+    from services.ocr_service import OCRService
+
+    services = {p: OCRService(precision=p) for p in ("fp32", "int8")}
+    crop_images = [img for _, img in crops]
+    texts, latency = {}, {}
+    for precision, service in services.items():
+        results, ms = _timed(service.predict_batch, crop_images)
+        texts[precision] = [clean_text(r) for r in results]
+        latency[precision] = round(ms / max(len(crop_images), 1), 2)
+    errors = sum(levenshtein_distance(ref, hyp) for ref, hyp in zip(texts["fp32"], texts["int8"]))
+    chars = sum(len(ref) for ref in texts["fp32"])
+    return {
+        "crops": len(crop_images),
+        "reference_chars": chars,
+        "char_accuracy": round(max(0.0, 1 - errors / chars), 4) if chars else 1.0,
+        "latency_ms_per_crop": latency,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["onnx", "openvino"], default="onnx")
+    parser.add_argument("--images", nargs="*", default=SHELF_IMAGES, help="Images d'étagère")
+    parser.add_argument("--crops", default=SPINE_CROPS, help="Glob des crops de tranches (OCR)")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU minimale pour apparier deux boxes")
+    parser.add_argument("--min-box-recall", type=float, default=0.98)
+    parser.add_argument("--min-char-accuracy", type=float, default=0.97)
+    parser.add_argument("--skip-detection", action="store_true")
+    parser.add_argument("--skip-ocr", action="store_true")
+    parser.add_argument("--json", help="Écrit les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    report, ok = {}, True
+    if not args.skip_detection:
+        report["detection"] = evaluate_detection(args.backend, _load(args.images), args.iou)
+        ok &= report["detection"]["box_recall"] >= args.min_box_recall
+    if not args.skip_ocr:
+        report["ocr"] = evaluate_ocr(_load([args.crops]))
+        ok &= report["ocr"]["char_accuracy"] >= args.min_char_accuracy
+    report["passed"] = bool(ok)
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    print("✅ INT8 accepté" if ok else "❌ Régression de précision INT8")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,94 @@
+"""Export bookshelf_best.pt to ONNX / OpenVINO and check the boxes still match
+
+Usage:
+    python export_model.py --backend onnx
+    python export_model.py --backend openvino --check-only
+Then run the server with DETECTION_BACKEND=onnx (or openvino).
+"""
+import argparse
+import glob
+import sys
+
+import cv2
+from ultralytics import YOLO
+
+import config
+from utils.image_utils import box_iou
+
+# Images used for the equivalence check
+CHECK_IMAGES = ["debug_crops/original.jpg", "debug_crops/debug_image.jpg"]
+
+
+def export(backend, imgsz):
+    """Write the converted model next to MODEL_PATH"""
+    fmt = {"onnx": "onnx", "openvino": "openvino"}[backend]
+    model = YOLO(config.MODEL_PATH)
+    # dynamic=True keeps the batch axis dynamic (needed by the detection batcher)
+    path = model.export(format=fmt, imgsz=imgsz, dynamic=True, simplify=(fmt == "onnx"))
+    print(f"✅ Modèle exporté : {path}")
+    return path
+
+
+def compare_boxes(reference, candidate, min_iou, conf_tol):
+    """Greedy one-to-one matching of two sets of (xyxy, conf). Returns a list of problems."""
+    problems = []
+    if len(reference) != len(candidate):
+        problems.append(f"nombre de boxes différent : {len(reference)} (pt) vs {len(candidate)}")
+    used = set()
+    for box, conf in reference:
+        best, best_iou = None, 0.0
+        for j, (other, _) in enumerate(candidate):
+            if j in used:
+                continue
+            iou = box_iou(box, other)
+            if iou > best_iou:
+                best, best_iou = j, iou
+        if best is None or best_iou < min_iou:
+            problems.append(f"box {box.round(1).tolist()} sans équivalent (IoU max {best_iou:.3f})")
+            continue
+        used.add(best)
+        if abs(conf - candidate[best][1]) > conf_tol:
+            problems.append(f"box {box.round(1).tolist()} : conf {conf:.3f} vs {candidate[best][1]:.3f}")
+    return problems
+
+
+def check(backend, imgsz, min_iou, conf_tol):
+    """Run the .pt model and the exported model on the same images and compare boxes"""
+    reference = YOLO(config.MODEL_PATH)
+    exported = YOLO(config.DETECTION_MODEL_PATHS[backend], task="detect")
+    images = [p for pattern in CHECK_IMAGES for p in glob.glob(pattern)]
+    if not images:
+        raise SystemExit("❌ Aucune image de contrôle trouvée")
+
+    failures = 0
+    for path in images:
+        img = cv2.imread(path)
+        outputs = []
+        for model in (reference, exported):
+            r = model.predict(img, conf=config.DEFAULT_CONF, iou=config.DEFAULT_IOU,
+                              imgsz=imgsz, device="cpu", verbose=False)[0]
+            outputs.append(list(zip(r.boxes.xyxy.cpu().numpy(), r.boxes.conf.cpu().numpy())))
+        problems = compare_boxes(outputs[0], outputs[1], min_iou, conf_tol)
+        if problems:
+            failures += 1
+            print(f"❌ {path}")
+            for p in problems:
+                print(f"    - {p}")
+        else:
+            print(f"✅ {path} : {len(outputs[0])} boxes identiques (IoU >= {min_iou})")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["onnx", "openvino"], required=True)
+    parser.add_argument("--imgsz", type=int, default=config.DEFAULT_IMGSZ)
+    parser.add_argument("--check-only", action="store_true", help="Ne pas ré-exporter")
+    parser.add_argument("--min-iou", type=float, default=0.9)
+    parser.add_argument("--conf-tol", type=float, default=0.05)
+    args = parser.parse_args()
+
+    if not args.check_only:
+        export(args.backend, args.imgsz)
+    ok = check(args.backend, args.imgsz, args.min_iou, args.conf_tol)
+    sys.exit(0 if ok else 1)
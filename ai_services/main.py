@@ -1,12 +1,27 @@
+import asyncio
+import json
+import time
 from typing import List
 
-from fastapi import FastAPI, Query, File, UploadFile, Form
+from fastapi import FastAPI, Query, File, UploadFile, Form, Request, Depends, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field, ConfigDict
 import uvicorn
-import mysql.connector
 
+import config
 from controllers import upload_controller, detection_controller
+from services.catalogue_index import catalogue_index
+from services.db_service import book_repository
+from services.inference_executor import inference_executor
+from services.detection_batcher import detection_batcher
+from services.shelf_state import shelf_state
+from services.artifact_writer import artifact_writer
+from services.artifact_renderer import artifact_renderer
+from services.model_loader import model_loader, require_models
+from services import metrics
+from services.metrics import timed
 
 # =========================================================
 #  APP CONFIGURATION
@@ -26,6 +41,7 @@ app = FastAPI(
         {"name": "OCR", "description": "OCR par livre détecté."},
         {"name": "Agents", "description": "Agents LLM pour résoudre les titres."},
         {"name": "Debug", "description": "Servir les images de debug / crops."},
+        {"name": "Santé", "description": "Sondes de vie et de disponibilité des modèles."},
         {
             "name": "Biblio",
             "description": "Scan d’une étagère et insertion en base de données.",
@@ -42,56 +58,203 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Gauges read at scrape time
+metrics.registry.register(metrics.Gauge(
+    "biblioscan_executor_queue_depth", "Inference tasks waiting for a worker",
+    source=lambda: inference_executor.stats()["queue_depth"],
+))
+metrics.registry.register(metrics.Gauge(
+    "biblioscan_artifact_queue_bytes", "Raw image bytes waiting for the artifact writer",
+    source=lambda: artifact_writer.stats()["queued_bytes"],
+))
+
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    """
+    In-flight gauge, request duration histogram and per-request stage timings
+
+    The request counts as served once its body is sent, not when the handler
+    returns: a streamed response (SSE) stays in flight until its last event.
+    WebSockets do not go through HTTP middlewares and are not measured.
+    """
+    token = metrics.start_request()
+    metrics.in_flight_requests.inc(1)
+    started = time.perf_counter()
+
+    def finish(status):
+        metrics.in_flight_requests.inc(-1)
+        route = request.scope.get("route")
+        metrics.request_seconds.observe(
+            time.perf_counter() - started,
+            path=getattr(route, "path", "unmatched"), status=status,
+        )
+
+    try:
+        response = await call_next(request)
+    except Exception:
+        finish(500)
+        raise
+    finally:
+        metrics.end_request(token)
+
+    body = response.body_iterator
+
+    async def measured_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            finish(response.status_code)
+
+    response.body_iterator = measured_body()
+    return response
+
+
+@app.on_event("startup")
+async def load_models():
+    """Load and warm the models in the background; /readyz reports when they are ready"""
+    model_loader.start()
+    # Catalogue index read from `livres` in a thread, off the event loop
+    if catalogue_index is not None:
+        catalogue_index.start_loading()
+
 # =========================================================
 #  BASE DE DONNÉES
 # =========================================================
-DB_CONFIG = {
-    "host": "localhost",
-    "user": "root",
-    "password": "",
-    "database": "bibliodb",
-}
 
+def insert_books(rows: list) -> dict:
+    """
+    Insertion groupée des livres d’un scan dans `livres` (une transaction).
 
-def insert_book(golden_record: dict, biblio_id: int, ligne: int, col: int) -> None:
-    """Insertion d’un livre dans la table `livres`."""
+    rows : liste de (golden_record, biblio_id, ligne, col).
+    Retourne {"ids": [...], "db_time_ms": ...}.
+    """
+    try:
+        with timed("db"):
+            inserted = book_repository.insert_books(rows)
+        print(f"✅ {len(inserted['ids'])} livre(s) inséré(s) en BD ({inserted['db_time_ms']} ms)")
+    except Exception as e:
+        print("❌ Erreur insertion BD :", e)
+        return {"ids": [], "db_time_ms": 0.0}
+
+    _index_books(inserted["ids"], rows)
+    return inserted
+
+
+def upsert_books(rows: list) -> dict:
+    """
+    Comme insert_books, mais idempotent : met à jour le livre existant de même
+    ISBN ou à la même position au lieu de créer un doublon.
+    """
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-
-        sql = """
-        INSERT INTO livres
-          (biblio_id, titre, auteur, date_pub,
-           position_ligne, position_colonne,
-           couverture_url, isbn)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-        """
-
-        cursor.execute(
-            sql,
-            (
-                biblio_id,
-                golden_record.get("titre"),
-                golden_record.get("auteur"),
-                golden_record.get("date_pub"),
-                ligne,
-                col,
-                golden_record.get("cover"),
-                golden_record.get("isbn"),
-            ),
+        with timed("db"):
+            upserted = book_repository.upsert_books(rows)
+        print(
+            f"✅ BD : {upserted['inserted']} inséré(s), {upserted['updated']} mis à jour, "
+            f"{upserted['deleted']} doublon(s) supprimé(s) ({upserted['db_time_ms']} ms)"
         )
+    except Exception as e:
+        print("❌ Erreur upsert BD :", e)
+        return {"ids": [None] * len(rows), "db_time_ms": 0.0}
+
+    _index_books(upserted["ids"], rows)
+    return upserted
 
-        conn.commit()
-        print("✅ Livre inséré en BD :", golden_record.get("titre"))
 
+def move_books(moves: list) -> dict:
+    """Déplacement de livres déjà en base : moves = [(livre_id, ligne, col)]."""
+    try:
+        with timed("db"):
+            moved = book_repository.move_books(moves)
+        print(f"✅ BD : {moved['moved']} livre(s) déplacé(s) ({moved['db_time_ms']} ms)")
+        return moved
     except Exception as e:
-        print("❌ Erreur insertion BD :", e)
-    finally:
-        try:
-            cursor.close()
-            conn.close()
-        except Exception:
-            pass
+        print("❌ Erreur déplacement BD :", e)
+        return {"moved": 0, "db_time_ms": 0.0}
+
+
+def _index_books(ids: list, rows: list) -> None:
+    """Keep the fuzzy catalogue index in sync with the table"""
+    if catalogue_index is None:
+        return
+    for livre_id, (golden_record, _, _, _) in zip(ids, rows):
+        catalogue_index.add({
+            "livre_id": livre_id,
+            "titre": golden_record.get("titre"),
+            "auteur": golden_record.get("auteur"),
+            "date_pub": golden_record.get("date_pub"),
+            "couverture_url": golden_record.get("cover"),
+            "isbn": golden_record.get("isbn"),
+        })
+
+
+def insert_book(golden_record: dict, biblio_id: int, ligne: int, col: int) -> None:
+    """Insertion d’un livre dans la table `livres`."""
+    insert_books([(golden_record, biblio_id, ligne, col)])
+
+
+def _golden_record(book: dict, idx: int) -> dict:
+    """Fiche `livres` d'un livre scanné (Google Books, sinon titre résolu / OCR)."""
+    gb_info = book.get("google_books_info") or {}
+    image_links = gb_info.get("image_links") or {}
+
+    titre = (
+        gb_info.get("title")
+        or book.get("resolved_title")
+        or book.get("text")
+        or f"Livre {idx+1}"
+    )
+    auteurs = gb_info.get("authors") or []
+    return {
+        "titre": titre,
+        "auteur": ", ".join(auteurs) or "Inconnu",
+        "date_pub": gb_info.get("published_date"),
+        "cover": image_links.get("thumbnail") or image_links.get("smallThumbnail"),
+        "isbn": gb_info.get("isbn"),  # optionnel (si tu l'ajoutes dans l’agent)
+    }
+
+
+def _store_books(biblio_id: int, ligne: int, first_col: int, books: list, previous: dict) -> tuple:
+    """
+    Enregistre les livres d'un scan de rangée (BD + index).
+
+    Les tranches reconnues du dernier scan (`previous` : {idx: {position_colonne,
+    livre_id}}) gardent leur livre_id et sont déplacées par livre_id si leur
+    colonne a changé ; seules les nouvelles tranches sont upsertées.
+    Retourne (livre_ids, db_time_ms).
+    """
+    livre_ids = [None] * len(books)
+    moves = []
+    for idx, spine in previous.items():
+        livre_ids[idx] = spine["livre_id"]
+        if spine["livre_id"] is not None and spine["position_colonne"] != first_col + idx:
+            moves.append((spine["livre_id"], ligne, first_col + idx))
+    # Déplacements d'abord : libère les colonnes avant l'upsert des nouveaux livres
+    moved = move_books(moves)
+
+    added = [idx for idx in range(len(books)) if idx not in previous]
+    rows = [
+        (_golden_record(books[idx], idx), biblio_id, ligne, first_col + idx)
+        for idx in added
+    ]
+    upserted = upsert_books(rows)
+    for idx, livre_id in zip(added, upserted["ids"]):
+        livre_ids[idx] = livre_id
+    return livre_ids, round(moved["db_time_ms"] + upserted["db_time_ms"], 2)
+
+
+def _save_shelf(biblio_id: int, ligne: int, first_col: int, spines: list, livre_ids: list,
+                removed_cols=()) -> None:
+    """Mémorise chaque tranche (hash, OCR, agent, livre_id) de la rangée pour le prochain scan."""
+    entries = {
+        first_col + idx: dict(spine, livre_id=livre_id)
+        for idx, (spine, livre_id) in enumerate(zip(spines, livre_ids))
+        # Pas d'état pour les échecs (agent / OCR) : ils seront retentés
+        if livre_id is not None and spine["agent_result"].get("confidence", 0.0) > 0
+    }
+    shelf_state.delete(biblio_id, ligne, [col for col in removed_cols if col not in entries])
+    shelf_state.save(biblio_id, ligne, entries)
 
 
 # =========================================================
@@ -172,15 +335,23 @@ class BookOCR(BaseModel):
         json_schema_extra={"example": 4},
     )
     text_detections: List[TextDetection]
-    crop_image: str = Field(
+    crop_image: str | None = Field(
         ...,
-        description="Chemin vers l'image crop du livre.",
-        json_schema_extra={"example": "/debug_crops/book_0.jpg"},
+        description="Chemin vers l'image crop du livre (None si la requête n'est pas capturée, cf. DEBUG_ARTIFACTS).",
+        json_schema_extra={"example": "/debug_crops/3f2a9c1e7b4d8a60/book_0.jpg"},
     )
     crop_image_annotated: str | None = Field(
         None,
         description="Chemin vers le crop annoté avec les régions OCR.",
-        json_schema_extra={"example": "/debug_crops/book_0_ocr.jpg"},
+        json_schema_extra={"example": "/debug_crops/3f2a9c1e7b4d8a60/book_0_ocr.jpg"},
+    )
+    ocr_skipped: str | None = Field(
+        None,
+        description=(
+            "Raison pour laquelle le crop n'a pas été lu (pré-filtre avant OCR) : "
+            "`empty`, `too_small`, `sliver`, `blank` ou `blurry` ; None si l'OCR a tourné."
+        ),
+        json_schema_extra={"example": None},
     )
 
     model_config = ConfigDict(validate_by_name=True)
@@ -231,19 +402,29 @@ class BookWithAgent(BookOCR):
             "example": "✅ Book found in Google Books! Title: Deep Learning ..."
         },
     )
+    cached: bool = Field(
+        False,
+        description="Tranche déjà vue au dernier scan de la rangée (OCR et agent réutilisés).",
+        json_schema_extra={"example": False},
+    )
+    unchanged: bool = Field(
+        False,
+        description="Tranche identique au dernier scan de cette position (BD non modifiée).",
+        json_schema_extra={"example": False},
+    )
 
 
 class DetectResponse(BaseModel):
     num_books: int = Field(..., json_schema_extra={"example": 3})
-    original_image: str = Field(
+    original_image: str | None = Field(
         ...,
         description="Chemin vers l'image originale sauvegardée.",
-        json_schema_extra={"example": "/debug_crops/original.jpg"},
+        json_schema_extra={"example": "/debug_crops/3f2a9c1e7b4d8a60/original.jpg"},
     )
-    annotated_image: str = Field(
+    annotated_image: str | None = Field(
         ...,
         description="Image annotée avec les bounding boxes YOLO.",
-        json_schema_extra={"example": "/debug_crops/debug_image.jpg"},
+        json_schema_extra={"example": "/debug_crops/3f2a9c1e7b4d8a60/debug_image.jpg"},
     )
 
 
@@ -253,27 +434,32 @@ class DetectAndOcrResponse(BaseModel):
     annotated_image: str | None = Field(
         ...,
         description="Image annotée avec les boîtes de détection par livre.",
-        json_schema_extra={"example": "/debug_crops/all_books_detected.jpg"},
+        json_schema_extra={"example": "/debug_crops/3f2a9c1e7b4d8a60/all_books_detected.jpg"},
     )
     original_image: str | None = Field(
         ...,
         description="Copie de l'image originale utilisée pour la détection.",
-        json_schema_extra={"example": "/debug_crops/original.jpg"},
+        json_schema_extra={"example": "/debug_crops/3f2a9c1e7b4d8a60/original.jpg"},
     )
 
 
 class DetectOcrAgentResponse(BaseModel):
     num_books: int = Field(..., json_schema_extra={"example": 3})
     books: List[BookWithAgent]
+    timings: dict | None = Field(
+        None,
+        description="Temps par étape (ms) si `timings=true` : decode, yolo, crop, ocr, llm, google_books, db, artifacts.",
+        json_schema_extra={"example": {"total_ms": 2310.4, "stages_ms": {"yolo": 85.2, "ocr": 640.1}, "calls": {"llm": 3}}},
+    )
     annotated_image: str | None = Field(
         ...,
         description="Image annotée avec les boîtes de détection et titres résolus.",
-        json_schema_extra={"example": "/debug_crops/all_books_detected.jpg"},
+        json_schema_extra={"example": "/debug_crops/3f2a9c1e7b4d8a60/all_books_detected.jpg"},
     )
     original_image: str | None = Field(
         ...,
         description="Copie de l'image originale utilisée pour la détection.",
-        json_schema_extra={"example": "/debug_crops/original.jpg"},
+        json_schema_extra={"example": "/debug_crops/3f2a9c1e7b4d8a60/original.jpg"},
     )
 
 
@@ -293,6 +479,73 @@ class ScanAndEnrichResponse(DetectOcrAgentResponse):
         description="Indice de colonne du premier livre scanné.",
         json_schema_extra={"example": 1},
     )
+    livre_ids: List[int | None] = Field(
+        default_factory=list,
+        description="Identifiants `livre_id` (insérés, mis à jour ou inchangés), dans l'ordre des livres.",
+        json_schema_extra={"example": [101, 102, 103]},
+    )
+    db_time_ms: float = Field(
+        0.0,
+        description="Temps passé en base de données pour ce scan (ms).",
+        json_schema_extra={"example": 12.5},
+    )
+
+
+class DiffBook(BookWithAgent):
+    position_colonne: int = Field(
+        ...,
+        description="Colonne actuelle du livre.",
+        json_schema_extra={"example": 4},
+    )
+    previous_colonne: int | None = Field(
+        None,
+        description="Colonne au scan précédent (livres déplacés ou inchangés).",
+        json_schema_extra={"example": 3},
+    )
+    livre_id: int | None = Field(
+        None,
+        description="Identifiant `livre_id` en base.",
+        json_schema_extra={"example": 102},
+    )
+
+
+class RemovedBook(BaseModel):
+    position_colonne: int = Field(..., json_schema_extra={"example": 5})
+    livre_id: int | None = Field(None, json_schema_extra={"example": 103})
+    resolved_title: str = Field("", json_schema_extra={"example": "Clean Code"})
+
+
+class ScanDiffResponse(BaseModel):
+    biblio_id: int = Field(..., json_schema_extra={"example": 1})
+    position_ligne: int = Field(..., json_schema_extra={"example": 1})
+    position_colonne: int = Field(..., json_schema_extra={"example": 1})
+    num_books: int = Field(..., json_schema_extra={"example": 3})
+    added: List[DiffBook] = Field(
+        default_factory=list, description="Nouvelles tranches (OCR + agent + insertion BD)."
+    )
+    moved: List[DiffBook] = Field(
+        default_factory=list, description="Tranches connues qui ont changé de colonne."
+    )
+    unchanged: List[DiffBook] = Field(
+        default_factory=list, description="Tranches connues restées à la même colonne."
+    )
+    removed: List[RemovedBook] = Field(
+        default_factory=list, description="Tranches du scan précédent absentes de ce scan."
+    )
+    annotated_image: str | None = Field(
+        None,
+        json_schema_extra={"example": "/debug_crops/3f2a9c1e7b4d8a60/all_books_detected.jpg"},
+    )
+    original_image: str | None = Field(
+        None,
+        json_schema_extra={"example": "/debug_crops/3f2a9c1e7b4d8a60/original.jpg"},
+    )
+    db_time_ms: float = Field(0.0, json_schema_extra={"example": 4.2})
+    timings: dict | None = Field(
+        None,
+        description="Temps par étape (ms) si `timings=true` : decode, yolo, crop, ocr, llm, google_books, db, artifacts.",
+        json_schema_extra={"example": {"total_ms": 2310.4, "stages_ms": {"yolo": 85.2, "ocr": 640.1}, "calls": {"llm": 3}}},
+    )
 
 
 # =========================================================
@@ -311,6 +564,7 @@ async def upload_image(file: UploadFile = File(...)):
 
 @app.post(
     "/detect",
+    dependencies=[Depends(require_models)],
     response_model=DetectResponse,
     tags=["Détection"],
     summary="Détecter les livres (YOLO seulement)",
@@ -335,6 +589,7 @@ async def detect(
 
 @app.post(
     "/detect_and_ocr",
+    dependencies=[Depends(require_models)],
     response_model=DetectAndOcrResponse,
     tags=["OCR"],
     summary="Détecter les livres et lancer l'OCR",
@@ -359,6 +614,7 @@ async def detect_and_ocr(
 
 @app.post(
     "/detect_and_ocr_and_agent",
+    dependencies=[Depends(require_models)],
     response_model=DetectOcrAgentResponse,
     tags=["Agents"],
     summary="Détecter les livres, lancer l'OCR et utiliser les agents LLM",
@@ -377,8 +633,97 @@ async def detect_and_ocr_and_agent(
         le=1.0,
         description="Seuil IOU pour la suppression de non-maxima (0-1).",
     ),
+    timings: bool = Query(
+        False, description="Ajoute le détail des temps par étape (`timings`) à la réponse."
+    ),
+):
+    result = await detection_controller.detect_and_ocr_and_agent(conf=conf, iou=iou)
+    if timings:
+        result["timings"] = metrics.current_timings()
+    return result
+
+
+def _error_event(e: Exception) -> dict:
+    return {"detail": getattr(e, "detail", None) or str(e)}
+
+
+async def _server_sent_events(first, events, timings: bool):
+    """Format (event, data) pairs as Server-Sent Events; a failure ends the stream with an "error" event"""
+    try:
+        event, data = first
+        while True:
+            if event == "done" and timings:
+                data["timings"] = metrics.current_timings()
+            yield f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+            event, data = await events.__anext__()
+    except StopAsyncIteration:
+        pass
+    except Exception as e:
+        yield f"event: error\ndata: {json.dumps(_error_event(e))}\n\n"
+    finally:
+        await events.aclose()
+
+
+@app.post(
+    "/detect_and_ocr_and_agent/stream",
+    dependencies=[Depends(require_models)],
+    tags=["Agents"],
+    summary="Pipeline complet en streaming (Server-Sent Events)",
+    description=(
+        "Même pipeline que `/detect_and_ocr_and_agent`, résultats envoyés au fil de l'eau "
+        "(`text/event-stream`) : un événement `detection` dès la fin de YOLO (nombre de livres "
+        "et boîtes), puis un événement `book` par livre dès que son OCR et son agent ont "
+        "terminé (dans l'ordre d'achèvement, `book_id` donne la position), enfin `done` "
+        "(image annotée) ou `error`."
+    ),
+    response_class=StreamingResponse,
+)
+async def detect_and_ocr_and_agent_stream(
+    conf: float = Query(
+        0.6, ge=0.0, le=1.0, description="Seuil de confiance YOLO (0-1)."
+    ),
+    iou: float = Query(
+        0.5,
+        ge=0.0,
+        le=1.0,
+        description="Seuil IOU pour la suppression de non-maxima (0-1).",
+    ),
+    timings: bool = Query(
+        False, description="Ajoute le détail des temps par étape (`timings`) à l'événement `done`."
+    ),
+):
+    events = detection_controller.stream_detect_and_ocr_and_agent(conf=conf, iou=iou)
+    # Run up to the detection before answering, so a missing image is still a plain 400
+    first = await events.__anext__()
+    return StreamingResponse(
+        _server_sent_events(first, events, timings),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/ws/detect_and_ocr_and_agent")
+async def detect_and_ocr_and_agent_ws(
+    websocket: WebSocket,
+    conf: float = Query(0.6, ge=0.0, le=1.0),
+    iou: float = Query(0.5, ge=0.0, le=1.0),
 ):
-    return await detection_controller.detect_and_ocr_and_agent(conf=conf, iou=iou)
+    """Same events as /detect_and_ocr_and_agent/stream, as JSON messages {"event", "data"}"""
+    await websocket.accept()
+    if not model_loader.ready:
+        await websocket.close(code=1013, reason=f"Models are not ready ({model_loader.state})")
+        return
+    events = detection_controller.stream_detect_and_ocr_and_agent(conf=conf, iou=iou)
+    try:
+        async for event, data in events:
+            await websocket.send_json({"event": event, "data": jsonable_encoder(data)})
+    except WebSocketDisconnect:
+        return
+    except Exception as e:
+        await websocket.send_json({"event": "error", "data": _error_event(e)})
+    finally:
+        await events.aclose()
+    await websocket.close()
 
 
 # =========================================================
@@ -386,6 +731,7 @@ async def detect_and_ocr_and_agent(
 # =========================================================
 @app.post(
     "/scan_and_enrich",
+    dependencies=[Depends(require_models)],
     response_model=ScanAndEnrichResponse,
     tags=["Biblio"],
     summary="Scanner une étagère et enrichir la base de données",
@@ -412,6 +758,9 @@ async def scan_and_enrich(
         le=1.0,
         description="Seuil IOU pour la suppression de non-maxima (0-1).",
     ),
+    timings: bool = Query(
+        False, description="Ajoute le détail des temps par étape (`timings`) à la réponse."
+    ),
 ):
     """
     Pour ton appli mobile :
@@ -422,47 +771,32 @@ async def scan_and_enrich(
           * position_ligne  -> int
           * position_colonne-> int
     """
-    # 1) Upload de l'image
-    await upload_controller.upload_image(file)
+    # 1) Décodage de l'image en mémoire (pas de fichier partagé entre requêtes)
+    img = await upload_controller.read_image(file)
 
-    # 2) Pipeline complet via le controller existant
+    # 2) Pipeline complet via le controller existant (positions inchangées
+    #    depuis le dernier scan : agent réutilisé)
+    shelf = {"biblio_id": biblio_id, "ligne": position_ligne, "col": position_colonne}
     result: dict = await detection_controller.detect_and_ocr_and_agent(
-        conf=conf, iou=iou
+        conf=conf, iou=iou, img=img, shelf=shelf
     )
 
     num_books = result.get("num_books", 0)
     books = result.get("books", [])
 
-    # 3) Insertion BDD
-    for idx, book in enumerate(books):
-        gb_info = book.get("google_books_info") or {}
-        image_links = gb_info.get("image_links") or {}
+    # 3) BDD : livres déjà connus déplacés par livre_id, seuls les nouveaux upsertés
+    livre_ids, db_time_ms = await asyncio.to_thread(
+        _store_books, biblio_id, position_ligne, position_colonne, books,
+        result.get("previous_spines", {}),
+    )
 
-        titre = (
-            gb_info.get("title")
-            or book.get("resolved_title")
-            or book.get("text")
-            or f"Livre {idx+1}"
-        )
-        auteurs = gb_info.get("authors") or []
-        date_pub = gb_info.get("published_date")
-        cover = image_links.get("thumbnail") or image_links.get("smallThumbnail")
-        isbn = gb_info.get("isbn")  # optionnel (si tu l'ajoutes dans l’agent)
-
-        golden_record = {
-            "titre": titre,
-            "auteur": ", ".join(auteurs) or "Inconnu",
-            "date_pub": date_pub,
-            "cover": cover,
-            "isbn": isbn,
-        }
-
-        col = position_colonne + idx  # colonne de départ + index du livre
-        insert_book(
-            golden_record=golden_record,
-            biblio_id=biblio_id,
-            ligne=position_ligne,
-            col=col,
+    # 4) Mémoriser chaque tranche (hash, OCR, agent, livre_id) pour le prochain scan,
+    #    et oublier les tranches retirées de la rangée
+    removed = result.get("removed_spines", [])
+    if books or removed:
+        await asyncio.to_thread(
+            _save_shelf, biblio_id, position_ligne, position_colonne, result["spines"], livre_ids,
+            [spine["position_colonne"] for spine in removed],
         )
 
     return ScanAndEnrichResponse(
@@ -473,6 +807,86 @@ async def scan_and_enrich(
         biblio_id=biblio_id,
         position_ligne=position_ligne,
         position_colonne=position_colonne,
+        livre_ids=livre_ids,
+        db_time_ms=db_time_ms,
+        timings=metrics.current_timings() if timings else None,
+    )
+
+
+@app.post(
+    "/scan_diff",
+    dependencies=[Depends(require_models)],
+    response_model=ScanDiffResponse,
+    tags=["Biblio"],
+    summary="Re-scanner une rangée et ne traiter que les changements",
+    description=(
+        "Aligne les tranches détectées sur celles du dernier scan de la rangée "
+        "(ordre gauche → droite + apparence). Seules les nouvelles tranches passent "
+        "par l'OCR, les agents et Google Books ; la réponse est un diff "
+        "(added, moved, unchanged, removed)."
+    ),
+)
+async def scan_diff(
+    file: UploadFile = File(...),
+    biblio_id: int = Form(..., description="Identifiant de la bibliothèque / étagère."),
+    position_ligne: int = Form(
+        ..., description="Numéro de ligne de l'étagère (1 = rangée du haut)."
+    ),
+    position_colonne: int = Form(
+        1, description="Colonne du premier livre scanné."
+    ),
+    conf: float = Query(
+        0.6, ge=0.0, le=1.0, description="Seuil de confiance YOLO (0-1)."
+    ),
+    iou: float = Query(
+        0.5,
+        ge=0.0,
+        le=1.0,
+        description="Seuil IOU pour la suppression de non-maxima (0-1).",
+    ),
+    timings: bool = Query(
+        False, description="Ajoute le détail des temps par étape (`timings`) à la réponse."
+    ),
+):
+    img = await upload_controller.read_image(file)
+    shelf = {"biblio_id": biblio_id, "ligne": position_ligne, "col": position_colonne}
+    result: dict = await detection_controller.detect_and_ocr_and_agent(
+        conf=conf, iou=iou, img=img, shelf=shelf
+    )
+    books = result.get("books", [])
+    previous = result.get("previous_spines", {})
+
+    # Livres connus : même livre_id, position mise à jour si déplacé ; nouveaux upsertés
+    livre_ids, db_time_ms = await asyncio.to_thread(
+        _store_books, biblio_id, position_ligne, position_colonne, books, previous
+    )
+
+    removed = result.get("removed_spines", [])
+    if books or removed:
+        await asyncio.to_thread(
+            _save_shelf, biblio_id, position_ligne, position_colonne, result["spines"], livre_ids,
+            [spine["position_colonne"] for spine in removed],
+        )
+
+    diff = {"added": [], "moved": [], "unchanged": []}
+    for idx, (book, livre_id) in enumerate(zip(books, livre_ids)):
+        from_col = previous[idx]["position_colonne"] if idx in previous else None
+        status = "added" if from_col is None else "unchanged" if book["unchanged"] else "moved"
+        diff[status].append(dict(
+            book, position_colonne=position_colonne + idx, previous_colonne=from_col, livre_id=livre_id
+        ))
+
+    return ScanDiffResponse(
+        biblio_id=biblio_id,
+        position_ligne=position_ligne,
+        position_colonne=position_colonne,
+        num_books=len(books),
+        removed=removed,
+        annotated_image=result.get("annotated_image"),
+        original_image=result.get("original_image"),
+        db_time_ms=db_time_ms,
+        timings=metrics.current_timings() if timings else None,
+        **diff,
     )
 
 
@@ -480,12 +894,79 @@ async def scan_and_enrich(
 #  DEBUG : servir les crops
 # =========================================================
 @app.get(
-    "/debug_crops/{filename}",
+    "/debug_crops/{filename:path}",
     tags=["Debug"],
     summary="Servir une image de debug (crop)",
 )
-async def serve_crop(filename: str):
-    return await detection_controller.serve_crop(filename)
+async def serve_crop(filename: str, request: Request):
+    return await detection_controller.serve_crop(filename, request)
+
+
+@app.get(
+    "/healthz",
+    tags=["Santé"],
+    summary="Sonde de vie",
+    description="Répond dès que le processus sert des requêtes, modèles chargés ou non.",
+)
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get(
+    "/readyz",
+    tags=["Santé"],
+    summary="Sonde de disponibilité",
+    description=(
+        "200 quand YOLO et PaddleOCR sont chargés et ont fait une inférence de chauffe, "
+        "503 (avec Retry-After) pendant le chargement ou après un échec."
+    ),
+)
+async def readyz():
+    status = model_loader.status()
+    if model_loader.ready:
+        return status
+    return JSONResponse(
+        status,
+        status_code=503,
+        headers={"Retry-After": str(config.MODEL_LOADING_RETRY_AFTER)},
+    )
+
+
+@app.get(
+    "/metrics",
+    tags=["Debug"],
+    summary="Métriques Prometheus",
+    description=(
+        "Histogrammes des temps par étape et des requêtes, compteurs (caches, échecs OCR, "
+        "erreurs LLM) et jauges (requêtes en cours, file de l'exécuteur)."
+    ),
+    response_class=PlainTextResponse,
+)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get(
+    "/debug/artifacts",
+    tags=["Debug"],
+    summary="État de l'écriture des artefacts de debug",
+    description="Politique DEBUG_ARTIFACTS, file d'écriture en arrière-plan et compteurs.",
+)
+async def artifacts_stats():
+    return {**artifact_writer.stats(), "rendering": artifact_renderer.stats()}
+
+
+@app.get(
+    "/debug/executor",
+    tags=["Debug"],
+    summary="Métriques de l'exécuteur d'inférence",
+    description="Profondeur de file d'attente et temps d'attente/exécution des tâches YOLO/OCR.",
+)
+async def executor_stats():
+    return {
+        **inference_executor.stats(),
+        "detection_batching": detection_batcher.stats(),
+    }
 
 
 # =========================================================
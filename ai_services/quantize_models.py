@@ -0,0 +1,182 @@
+"""Produce INT8 variants of the YOLO detector and the PaddleOCR recognizer
+
+Calibration uses the shelf photos / spine crops matched by
+config.CALIBRATION_IMAGES (debug_crops/*.jpg by default).
+
+Usage:
+    python quantize_models.py --detection onnx        # -> bookshelf_best_int8.onnx
+    python quantize_models.py --detection openvino    # -> bookshelf_best_int8_openvino_model/
+    python quantize_models.py --recognition           # -> config.OCR_REC_INT8_DIR
+Then check accuracy with evaluate_quantization.py before setting
+DETECTION_PRECISION=int8 / OCR_PRECISION=int8.
+"""
+import argparse
+import glob
+import math
+import os
+import shutil
+import tempfile
+
+import cv2
+import numpy as np
+
+import config
+
+# Input size of the PP-OCR recognizer (C, H, W)
+REC_IMAGE_SHAPE = (3, 48, 320)
+
+
+def calibration_images(limit=None):
+    paths = sorted(glob.glob(config.CALIBRATION_IMAGES))
+    if not paths:
+        raise SystemExit(f"❌ Aucune image de calibration : {config.CALIBRATION_IMAGES}")
+    return paths[:limit] if limit else paths
+
+
+# =========================================================
+#  DETECTION (YOLO)
+# =========================================================
+def _letterbox(img, size):
+    """Resize keeping the aspect ratio and pad to size x size (YOLO input)"""
+    h, w = img.shape[:2]
+    scale = size / max(h, w)
+    resized = cv2.resize(img, (int(round(w * scale)), int(round(h * scale))))
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top = (size - resized.shape[0]) // 2
+    left = (size - resized.shape[1]) // 2
+    canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    blob = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return blob[None]
+
+
+def quantize_detection_onnx(imgsz, limit):
+    """Static INT8 quantization of the exported ONNX model with ONNX Runtime"""
+    from onnxruntime import InferenceSession
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    )
+
+    fp32_path = config.DETECTION_MODEL_PATHS["onnx"]
+    if not os.path.exists(fp32_path):
+        from export_model import export
+        export("onnx", imgsz)
+    input_name = InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class ShelfReader(CalibrationDataReader):
+        def __init__(self):
+            self._paths = iter(calibration_images(limit))
+
+        def get_next(self):
+            for path in self._paths:
+                img = cv2.imread(path)
+                if img is not None:
+                    return {input_name: _letterbox(img, imgsz)}
+            return None
+
+    out_path = config.DETECTION_INT8_MODEL_PATHS["onnx"]
+    quantize_static(
+        fp32_path, out_path, ShelfReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+    print(f"✅ Détecteur INT8 (ONNX) : {out_path}")
+
+
+def quantize_detection_openvino(imgsz, limit):
+    """INT8 OpenVINO export (NNCF) through Ultralytics, calibrated on the shelf images"""
+    from ultralytics import YOLO
+
+    model = YOLO(config.MODEL_PATH)
+    with tempfile.TemporaryDirectory() as tmp:
+        images_dir = os.path.join(tmp, "images")
+        os.makedirs(images_dir)
+        for path in calibration_images(limit):
+            shutil.copy(path, images_dir)
+        data_yaml = os.path.join(tmp, "calibration.yaml")
+        with open(data_yaml, "w") as f:
+            f.write(f"path: {tmp}\ntrain: images\nval: images\n")
+            f.write(f"names: {dict(model.names)}\n")
+        path = model.export(format="openvino", imgsz=imgsz, int8=True, dynamic=True, data=data_yaml)
+    print(f"✅ Détecteur INT8 (OpenVINO) : {path}")
+
+
+# =========================================================
+#  RECOGNITION (PaddleOCR)
+# =========================================================
+def rec_preprocess(line_img):
+    """Resize a text line to the recognizer input (height 48, padded width 320), normalized CHW"""
+    c, h, w = REC_IMAGE_SHAPE
+    ratio = line_img.shape[1] / max(line_img.shape[0], 1)
+    resized_w = min(w, int(math.ceil(h * ratio)))
+    resized = cv2.resize(line_img, (max(resized_w, 1), h)).astype(np.float32)
+    resized = (resized.transpose(2, 0, 1) / 255.0 - 0.5) / 0.5
+    padded = np.zeros((c, h, w), dtype=np.float32)
+    padded[:, :, :resized.shape[2]] = resized
+    return padded
+
+
+def quantize_recognition(rec_model_dir, limit):
+    """Post-training static quantization of the recognizer with PaddleSlim"""
+    import paddle
+    from paddleslim.quant import quant_post_static
+    from services.ocr_service import OCRService
+    from utils.image_utils import crop_text_region
+
+    ocr = OCRService(precision="fp32")
+    if not ocr._available:
+        raise SystemExit("❌ PaddleOCR indisponible")
+    rec_model_dir = rec_model_dir or ocr.ocr.args.rec_model_dir
+
+    # Calibration samples: text lines detected on the calibration images
+    samples = []
+    for path in calibration_images(limit):
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        det = ocr.ocr.ocr(img, rec=False, cls=False)
+        for box in (det[0] if det else None) or []:
+            samples.append(rec_preprocess(crop_text_region(img, box)))
+    if not samples:
+        raise SystemExit("❌ Aucune ligne de texte trouvée pour la calibration")
+    print(f" {len(samples)} lignes de texte pour la calibration")
+
+    def sample_generator():
+        for sample in samples:
+            yield [sample]
+
+    paddle.enable_static()
+    executor = paddle.static.Executor(paddle.CPUPlace())
+    quant_post_static(
+        executor=executor,
+        model_dir=rec_model_dir,
+        quantize_model_path=config.OCR_REC_INT8_DIR,
+        sample_generator=sample_generator,
+        model_filename="inference.pdmodel",
+        params_filename="inference.pdiparams",
+        save_model_filename="inference.pdmodel",
+        save_params_filename="inference.pdiparams",
+        batch_size=8,
+        algo="KL",
+    )
+    print(f"✅ Reconnaissance INT8 : {config.OCR_REC_INT8_DIR}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--detection", choices=["onnx", "openvino"])
+    parser.add_argument("--recognition", action="store_true")
+    parser.add_argument("--rec-model-dir", help="Modèle FP32 du recognizer (défaut : celui de PaddleOCR)")
+    parser.add_argument("--imgsz", type=int, default=config.DEFAULT_IMGSZ)
+    parser.add_argument("--limit", type=int, help="Nombre max d'images de calibration")
+    args = parser.parse_args()
+
+    if not args.detection and not args.recognition:
+        parser.error("--detection et/ou --recognition requis")
+    if args.detection == "onnx":
+        quantize_detection_onnx(args.imgsz, args.limit)
+    elif args.detection == "openvino":
+        quantize_detection_openvino(args.imgsz, args.limit)
+    if args.recognition:
+        quantize_recognition(args.rec_model_dir, args.limit)
@@ -2,20 +2,16 @@
 import os
 import sys
 import json
+import asyncio
 from typing import TypedDict, Optional
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
-
-# Lazy import for requests
-def _import_requests():
-    """Lazy import for requests"""
-    try:
-        import requests
-        return requests
-    except ImportError as e:
-        raise ImportError(f"requests is not installed. Please install it with: pip install requests") from e
+from services.resolution_cache import resolution_cache
+from services.catalogue_index import catalogue_index
+from services.google_books_client import get_google_books_client
+from services.metrics import timed, cache_events, llm_errors, llm_requests, llm_tokens, llm_batch_fallbacks
 
 # Lazy imports - only import when needed
 def _import_langgraph():
@@ -51,6 +47,78 @@ def _import_langchain_messages():
         raise ImportError(f"langchain-core is not installed. Please install it with: pip install langchain-core") from e
 
 
+# Rough token estimate of the shelf-batch prompt: ~4 characters per token, plus
+# the JSON object each book adds to the answer
+_CHARS_PER_TOKEN = 4
+_ANSWER_TOKENS_PER_BOOK = 60
+
+SHELF_PROMPT = """You are a book title resolution expert. Each entry below is the OCR text extracted from one book spine of the same shelf photo. Resolve every entry to the most likely book title.
+
+OCR texts (JSON):
+{entries}
+
+Instructions:
+1. Analyze each OCR text carefully. It may contain errors, missing characters, or formatting issues.
+2. Try to identify the actual book title from each OCR text; neighbouring spines may belong to the same series or author.
+3. If a text is unclear or you cannot identify a specific book, give your best guess or the original text, with a low confidence.
+4. Provide a brief reasoning for each resolution.
+5. Each title should be in the same language as its OCR text.
+
+Respond with only a JSON array, one object per entry, in any order:
+[{{"id": <entry id>, "title": "<resolved book title>", "reasoning": "<your reasoning>", "confidence": <0.0-1.0>}}]"""
+
+
+def _count_usage(response, mode: str) -> None:
+    """Request and token counters (tokens when the provider reports them)"""
+    llm_requests.inc(mode=mode)
+    usage = getattr(response, "usage_metadata", None) or {}
+    for direction in ("input", "output"):
+        if usage.get(f"{direction}_tokens"):
+            llm_tokens.inc(usage[f"{direction}_tokens"], mode=mode, direction=direction)
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+
+def _parse_shelf_answer(response_text: str, ids) -> dict:
+    """
+    {id: {"resolved_title", "confidence", "reasoning"}} for the valid entries of a shelf answer
+
+    Tolerates code fences or text around the JSON array (brackets included):
+    the answer is the first "[" where a list of objects decodes. An entry is
+    kept only with a known integer id, a non-empty title and a confidence
+    in [0, 1].
+    """
+    decoder = json.JSONDecoder()
+    entries = []
+    start = response_text.find("[")
+    while start >= 0:
+        try:
+            candidate, _ = decoder.raw_decode(response_text, start)
+        except ValueError:
+            candidate = None
+        if isinstance(candidate, list) and candidate and all(isinstance(e, dict) for e in candidate):
+            entries = candidate
+            break
+        start = response_text.find("[", start + 1)
+    parsed = {}
+    for entry in entries:
+        if type(entry.get("id")) is not int or entry["id"] not in ids or entry["id"] in parsed:
+            continue
+        title, confidence = entry.get("title"), entry.get("confidence", 0.5)
+        if not isinstance(title, str) or not title.strip():
+            continue
+        if isinstance(confidence, bool) or not isinstance(confidence, (int, float)) or not 0 <= confidence <= 1:
+            continue
+        parsed[entry["id"]] = {
+            "resolved_title": title.strip(),
+            "confidence": float(confidence),
+            "reasoning": str(entry.get("reasoning") or "Title resolved from OCR text"),
+        }
+    return parsed
+
+
 class AgentState(TypedDict):
     """State schema for the book title resolution agent"""
     ocr_text: str  # Input OCR text from OCR service
@@ -73,7 +141,11 @@ class BookTitleResolverAgent:
             llm_provider: Either "openai" or "ollama"
             model_name: Model name (e.g., "gpt-4", "llama3.2")
         """
+        self.llm_provider = llm_provider
         self.llm = self._initialize_llm(llm_provider, model_name)
+        self.model_name = getattr(self.llm, "model_name", None) or getattr(self.llm, "model", None) or model_name
+        self.cache = resolution_cache
+        self.catalogue = catalogue_index
         self.graph = self._build_graph()
         print(f"✅ BookTitleResolverAgent initialized with {llm_provider}")
     
@@ -85,6 +157,7 @@ class BookTitleResolverAgent:
             if not api_key:
                 print("⚠️  Warning: OPENAI_API_KEY not found. Using Ollama as fallback.")
                 provider = "ollama"
+                self.llm_provider = provider
             else:
                 # Set environment variable if not already set (for ChatOpenAI to pick up)
                 if not os.getenv("OPENAI_API_KEY"):
@@ -138,7 +211,9 @@ Confidence: [0.0-1.0]"""
             # Call the LLM
             HumanMessage = _import_langchain_messages()
             messages = [HumanMessage(content=prompt)]
-            response = self.llm.invoke(messages)
+            with timed("llm"):
+                response = self.llm.invoke(messages)
+            _count_usage(response, "book")
             
             # Parse the response
             response_text = response.content if hasattr(response, 'content') else str(response)
@@ -182,6 +257,7 @@ Confidence: [0.0-1.0]"""
         except Exception as e:
             # Fallback to original text if LLM call fails
             print(f"⚠️  Error in LLM call: {e}")
+            llm_errors.inc()
             return {
                 "resolved_title": ocr_text,
                 "confidence": 0.2,
@@ -205,20 +281,13 @@ Confidence: [0.0-1.0]"""
             }
         
         try:
-            requests = _import_requests()
-            
-            # Search Google Books API
+            # Search Google Books API (shared pooled + cached client)
             # The API is free and doesn't require authentication for basic searches
-            base_url = "https://www.googleapis.com/books/v1/volumes"
-            params = {
-                "q": f'intitle:"{resolved_title}"',  # Search by title
-                "maxResults": 5
-            }
-            
-            response = requests.get(base_url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
+            with timed("google_books"):
+                data = get_google_books_client().search(
+                    f'intitle:"{resolved_title}"',  # Search by title
+                    max_results=5
+                )
             total_items = data.get("totalItems", 0)
             items = data.get("items", [])
             
@@ -342,8 +411,187 @@ Confidence: [0.0-1.0]"""
                 - confidence: Confidence score (0.0-1.0)
                 - reasoning: Reasoning for the resolution
         """
-        # Prepare initial state
-        initial_state: AgentState = {
+        # Known book or cache hit: skip both the LLM and Google Books
+        known = self._lookup_known(ocr_text)
+        if known is not None:
+            return known
+        
+        # Invoke the graph
+        result = self.graph.invoke(self._initial_state(ocr_text))
+        
+        # Return the result with Google Books information
+        return self._cache_set(ocr_text, self._format_result(result))
+    
+    async def aresolve(self, ocr_text: str) -> dict:
+        """
+        Async version of `resolve` (runs the graph with `ainvoke`)
+
+        The catalogue search and the cache (SQLite) run in a thread, off
+        the event loop.
+        """
+        known = await asyncio.to_thread(self._lookup_known, ocr_text)
+        if known is not None:
+            return known
+        result = await self.graph.ainvoke(self._initial_state(ocr_text))
+        return await asyncio.to_thread(self._cache_set, ocr_text, self._format_result(result))
+    
+    def _lookup_known(self, ocr_text: str):
+        """Catalogue hit, else cached resolution of this OCR text (None if neither)"""
+        known = self._lookup_catalogue(ocr_text)
+        if known is None:
+            known = self._cache_get(ocr_text)
+        return known
+    
+    def _lookup_catalogue(self, ocr_text: str):
+        """Return the catalogued book matching this OCR text (None if no close match)"""
+        if self.catalogue is None or not ocr_text or not ocr_text.strip():
+            return None
+        try:
+            match = self.catalogue.search(ocr_text)
+        except Exception as e:
+            print(f"⚠️  Catalogue index error: {e}")
+            return None
+        cache_events.inc(cache="catalogue", outcome="miss" if match is None else "hit")
+        if match is None:
+            return None
+        return self.catalogue.to_resolution(*match)
+    
+    def _cache_get(self, ocr_text: str):
+        """Look up a previous resolution of this OCR text (None on miss or cache disabled)"""
+        if self.cache is None or not ocr_text or not ocr_text.strip():
+            return None
+        try:
+            cached = self.cache.get(ocr_text, self.llm_provider, str(self.model_name))
+        except Exception as e:
+            print(f"⚠️  Resolution cache read error: {e}")
+            return None
+        cache_events.inc(cache="resolution", outcome="miss" if cached is None else "hit")
+        return cached
+    
+    def _cache_set(self, ocr_text: str, result: dict) -> dict:
+        """Store a resolution, unless the LLM or Google Books call failed"""
+        if self.cache is None or not ocr_text or not ocr_text.strip():
+            return result
+        if result.get("reasoning", "").startswith("LLM error") \
+                or result.get("google_books_verification", "").startswith("Could not verify"):
+            return result
+        try:
+            self.cache.set(ocr_text, self.llm_provider, str(self.model_name), result)
+        except Exception as e:
+            print(f"⚠️  Resolution cache write error: {e}")
+        return result
+    
+    async def aresolve_many(self, ocr_texts: list, max_concurrency: int = None) -> list:
+        """
+        Resolve several OCR texts concurrently
+        
+        Args:
+            ocr_texts: OCR texts, one per book
+            max_concurrency: Maximum number of graphs running at the same time.
+                If None, uses config.AGENT_MAX_CONCURRENCY
+            
+        Returns:
+            List of results in the same order as `ocr_texts`. If the resolution
+            of a book raised, its entry is the exception instead of a dict.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or config.AGENT_MAX_CONCURRENCY)
+        
+        async def _resolve_one(ocr_text):
+            async with semaphore:
+                return await self.aresolve(ocr_text)
+        
+        return await asyncio.gather(
+            *(_resolve_one(text) for text in ocr_texts),
+            return_exceptions=True
+        )
+    
+    async def aresolve_shelf(self, ocr_texts: list, max_concurrency: int = None,
+                             max_tokens: int = None) -> list:
+        """
+        Resolve the OCR texts of one shelf with one LLM request per chunk instead of one per book
+        
+        Catalogue and cache hits are answered first (one lookup pass for the
+        shelf, in a thread). The other (distinct)
+        texts are sent together as JSON, in chunks of about `max_tokens`
+        estimated tokens (config.AGENT_SHELF_BATCH_MAX_TOKENS), and the JSON
+        array answered is validated entry by entry. Valid titles then go
+        through the Google Books verification like a single resolution;
+        entries missing or invalid (or a whole chunk whose call failed) fall
+        back to the per-book agent.
+            
+        Returns:
+            Same as `aresolve_many`: results in input order, an exception
+            instead of a dict for a book whose resolution raised.
+        """
+        max_tokens = max_tokens or config.AGENT_SHELF_BATCH_MAX_TOKENS
+        semaphore = asyncio.Semaphore(max_concurrency or config.AGENT_MAX_CONCURRENCY)
+        results = {}
+        pending = []
+        texts = list(dict.fromkeys(ocr_texts))
+        lookups = await asyncio.to_thread(lambda: [self._lookup_known(text) for text in texts])
+        for text, known in zip(texts, lookups):
+            if known is not None:
+                results[text] = known
+            elif text and text.strip():
+                pending.append(text)
+            else:
+                results[text] = await self.aresolve(text)
+        
+        # Chunks within the token budget (at least one book each)
+        chunks, current, used = [], [], 0
+        for text in pending:
+            cost = _estimate_tokens(json.dumps(text)) + _ANSWER_TOKENS_PER_BOOK
+            if current and used + cost > max_tokens:
+                chunks.append(current)
+                current, used = [], 0
+            current.append(text)
+            used += cost
+        if current:
+            chunks.append(current)
+        
+        async def _verify(text, resolution):
+            async with semaphore:
+                state = dict(self._initial_state(text), **resolution)
+                state.update(await asyncio.to_thread(self._search_google_books, state))
+                return await asyncio.to_thread(self._cache_set, text, self._format_result(state))
+        
+        async def _fallback(text):
+            async with semaphore:
+                return await self.aresolve(text)
+        
+        async def _resolve_chunk(texts):
+            async with semaphore:
+                resolutions = await self._aresolve_titles_batch(texts)
+            llm_batch_fallbacks.inc(len(texts) - len(resolutions))
+            outcomes = await asyncio.gather(
+                *(_verify(text, resolutions[i]) if i in resolutions else _fallback(text)
+                  for i, text in enumerate(texts)),
+                return_exceptions=True
+            )
+            results.update(zip(texts, outcomes))
+        
+        await asyncio.gather(*(_resolve_chunk(chunk) for chunk in chunks))
+        return [results[text] for text in ocr_texts]
+    
+    async def _aresolve_titles_batch(self, ocr_texts: list) -> dict:
+        """One LLM request for several OCR texts: {index: resolution} for the valid answers"""
+        entries = json.dumps([{"id": i, "ocr_text": text} for i, text in enumerate(ocr_texts)], ensure_ascii=False)
+        try:
+            HumanMessage = _import_langchain_messages()
+            with timed("llm"):
+                response = await self.llm.ainvoke([HumanMessage(content=SHELF_PROMPT.format(entries=entries))])
+            _count_usage(response, "shelf")
+        except Exception as e:
+            print(f"⚠️  Error in shelf LLM call ({len(ocr_texts)} books): {e}")
+            llm_errors.inc()
+            return {}
+        response_text = response.content if hasattr(response, 'content') else str(response)
+        return _parse_shelf_answer(response_text, range(len(ocr_texts)))
+    
+    @staticmethod
+    def _initial_state(ocr_text: str) -> AgentState:
+        """Build the initial graph state for an OCR text"""
+        return {
             "ocr_text": ocr_text,
             "resolved_title": "",
             "confidence": 0.0,
@@ -352,11 +600,10 @@ Confidence: [0.0-1.0]"""
             "google_books_info": None,
             "google_books_verification": ""
         }
-        
-        # Invoke the graph
-        result = self.graph.invoke(initial_state)
-        
-        # Return the result with Google Books information
+    
+    @staticmethod
+    def _format_result(result: dict) -> dict:
+        """Extract the public fields from the final graph state"""
         return {
             "resolved_title": result.get("resolved_title", ""),
             "confidence": result.get("confidence", 0.0),
@@ -416,3 +663,40 @@ def resolve_book_title(ocr_text: str, llm_provider: str = None, model_name: str
     
     agent = get_agent(llm_provider=llm_provider, model_name=model_name)
     return agent.resolve(ocr_text)
+
+
+async def aresolve_book_title(ocr_text: str, llm_provider: str = None, model_name: str = None) -> dict:
+    """Async version of `resolve_book_title` (one book, e.g. as soon as its OCR is done)"""
+    if llm_provider is None:
+        llm_provider = config.LLM_PROVIDER
+    if model_name is None:
+        model_name = config.LLM_MODEL
+    
+    agent = get_agent(llm_provider=llm_provider, model_name=model_name)
+    return await agent.aresolve(ocr_text)
+
+
+async def aresolve_book_titles(ocr_texts: list, llm_provider: str = None, model_name: str = None,
+                               max_concurrency: int = None) -> list:
+    """
+    Resolve the OCR texts of a whole shelf concurrently
+    (one LLM request per chunk of the shelf when config.AGENT_SHELF_BATCH is on)
+    
+    Args:
+        ocr_texts: OCR texts, one per book
+        llm_provider: LLM provider ("openai" or "ollama"). If None, uses config.LLM_PROVIDER
+        model_name: Optional model name override. If None, uses config.LLM_MODEL
+        max_concurrency: Concurrency limit. If None, uses config.AGENT_MAX_CONCURRENCY
+        
+    Returns:
+        List of result dicts (or exceptions for failed books), in input order
+    """
+    if llm_provider is None:
+        llm_provider = config.LLM_PROVIDER
+    if model_name is None:
+        model_name = config.LLM_MODEL
+    
+    agent = get_agent(llm_provider=llm_provider, model_name=model_name)
+    if config.AGENT_SHELF_BATCH:
+        return await agent.aresolve_shelf(ocr_texts, max_concurrency=max_concurrency)
+    return await agent.aresolve_many(ocr_texts, max_concurrency=max_concurrency)
@@ -0,0 +1,104 @@
+"""On-demand rendering of the annotated debug images from the stored boxes / polygons"""
+import os
+import sys
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from utils.artifacts import resolve_artifact
+
+# Drawing instructions of a request, written next to its crops
+ANNOTATIONS_FILE = "annotations.json"
+
+
+def draw_boxes(image, boxes):
+    """Book boxes with their label: [{"bbox": [x1, y1, x2, y2], "label": str}]"""
+    annotated = image.copy()
+    for box in boxes:
+        x1, y1, x2, y2 = box["bbox"]
+        cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 0), 3)
+        cv2.putText(annotated, box["label"], (x1, max(25, y1-10)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    return annotated
+
+
+def draw_polygons(image, polys):
+    """OCR text regions (crop-relative 4-point polygons)"""
+    annotated = image.copy()
+    for poly in polys:
+        points = np.asarray(poly).astype(np.int32)
+        cv2.polylines(annotated, [points], True, (0, 255, 0), 2)
+    return annotated
+
+
+class ArtifactRenderer:
+    """
+    Renders annotated views only when they are requested
+
+    The controllers store, per request, the original image, the raw crops
+    and ANNOTATIONS_FILE:
+        {"all_books_detected.jpg": {"source": "original.jpg", "boxes": [...]},
+         "book_0_ocr.jpg": {"source": "book_0.jpg", "polys": [...]}, ...}
+    `render` draws and JPEG-encodes one view, keeping the last
+    `max_entries` renders in an LRU.
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries or config.ANNOTATED_CACHE_SIZE
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, filename: str):
+        """(jpeg_bytes, etag) for "<request_id>/<view>", or None if it is not a renderable view"""
+        with self._lock:
+            if filename in self._cache:
+                self._cache.move_to_end(filename)
+                self.hits += 1
+                return self._cache[filename]
+
+        request_id, _, name = filename.rpartition("/")
+        spec_path = resolve_artifact(f"{request_id}/{ANNOTATIONS_FILE}")
+        if not request_id or spec_path is None:
+            return None
+        with open(spec_path) as f:
+            spec = json.load(f).get(name)
+        if spec is None:
+            return None
+        source_path = resolve_artifact(f"{request_id}/{spec['source']}")
+        source = cv2.imread(source_path) if source_path else None
+        if source is None:
+            return None
+
+        if "boxes" in spec:
+            image = draw_boxes(source, spec["boxes"])
+        else:
+            image = draw_polygons(source, spec.get("polys", []))
+        ok, encoded = cv2.imencode(".jpg", image)
+        if not ok:
+            return None
+        data = encoded.tobytes()
+        etag = '"' + hashlib.sha1(data).hexdigest()[:16] + '"'
+
+        with self._lock:
+            self.misses += 1
+            self._cache[filename] = (data, etag)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return data, etag
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._cache), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses}
+
+
+# Global renderer instance
+artifact_renderer = ArtifactRenderer()
@@ -0,0 +1,116 @@
+"""Background writer for debug artifacts (crops, annotated images) with a capture policy"""
+import os
+import sys
+import queue
+import time
+import random
+import threading
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from utils.artifacts import artifact_path, prune_old_requests
+from services.metrics import observe_stage, ARTIFACT_WRITE_STAGE
+
+MODES = ("off", "sampled", "always")
+
+
+class ArtifactWriter:
+    """
+    Decides which requests keep debug artifacts and writes them off the hot path
+
+    mode "off" never captures, "always" captures every request, "sampled"
+    captures a `sample_rate` fraction of them. Captured images are JPEG
+    encoded and written by one background thread; at most `max_bytes` of
+    raw images wait in the queue, further submissions are dropped.
+    """
+
+    def __init__(self, mode: str = None, sample_rate: float = None, max_bytes: int = None):
+        self.mode = mode or config.DEBUG_ARTIFACTS
+        if self.mode not in MODES:
+            raise ValueError(f"DEBUG_ARTIFACTS must be one of {MODES}, got {self.mode!r}")
+        self.sample_rate = config.DEBUG_ARTIFACTS_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.max_bytes = max_bytes or config.DEBUG_ARTIFACTS_MAX_QUEUE_BYTES
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.queued_bytes = 0
+        self.captured = 0       # requests that kept their artifacts
+        self.skipped = 0        # requests not sampled / mode off
+        self.dropped = 0        # requests rejected because the queue was full
+        self.written = 0        # files written
+        self.failed = 0
+
+    def capture(self) -> bool:
+        """Whether the current request should produce artifacts"""
+        keep = self.mode == "always" or (self.mode == "sampled" and random.random() < self.sample_rate)
+        with self._lock:
+            if not keep:
+                self.skipped += 1
+        return keep
+
+    def submit(self, request_id: str, images: dict) -> bool:
+        """
+        Queue {name: image or text} for writing (text is written as is, e.g. JSON)
+        Returns False (nothing written) when the queue is full.
+        """
+        size = sum(len(item) if isinstance(item, str) else item.nbytes for item in images.values())
+        with self._lock:
+            if self.queued_bytes + size > self.max_bytes:
+                self.dropped += 1
+                return False
+            self.queued_bytes += size
+            self.captured += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+                self._thread.start()
+        self._queue.put((request_id, images, size))
+        return True
+
+    def _run(self):
+        while True:
+            request_id, images, size = self._queue.get()
+            started = time.perf_counter()
+            for name, image in images.items():
+                try:
+                    if isinstance(image, str):
+                        with open(artifact_path(request_id, name), "w") as f:
+                            f.write(image)
+                    else:
+                        cv2.imwrite(artifact_path(request_id, name), image)
+                    self.written += 1
+                except Exception as e:
+                    self.failed += 1
+                    print(f"⚠️  Could not write artifact {request_id}/{name}: {e}")
+            observe_stage(ARTIFACT_WRITE_STAGE, time.perf_counter() - started)
+            try:
+                prune_old_requests()
+            except Exception as e:
+                print(f"⚠️  Could not prune old artifacts: {e}")
+            with self._lock:
+                self.queued_bytes -= size
+            self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued artifact is written (scripts, tests)"""
+        self._queue.join()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "sample_rate": self.sample_rate,
+                "queued_requests": self._queue.qsize(),
+                "queued_bytes": self.queued_bytes,
+                "max_bytes": self.max_bytes,
+                "captured": self.captured,
+                "skipped": self.skipped,
+                "dropped": self.dropped,
+                "written": self.written,
+                "failed": self.failed,
+            }
+
+
+# Global writer instance
+artifact_writer = ArtifactWriter()
@@ -0,0 +1,192 @@
+"""Fuzzy in-process index over the books already stored in the `livres` table"""
+import os
+import re
+import sys
+import time
+import threading
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from utils.ocr_utils import normalize_text, levenshtein_distance
+
+# Placeholder titles written by scan_and_enrich when nothing was resolved
+_PLACEHOLDER_TITLE = re.compile(r"^livre \d+$")
+
+
+def _trigrams(text: str) -> set:
+    """Character trigrams of a normalized text (padded at word boundaries)"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def levenshtein_ratio(a: str, b: str) -> float:
+    """Similarity in [0, 1] derived from the Levenshtein edit distance"""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    return 1.0 - levenshtein_distance(a, b) / max(len(a), len(b))
+
+
+class CatalogueIndex:
+    """
+    Trigram index over catalogued titles/authors with an edit-distance re-rank
+
+    The index is loaded from the database in a background thread (at startup,
+    or on the first search) and is kept up to date with `add` whenever a book
+    is inserted. Searches never wait for the load: until it completes they
+    only see the books added since; a failed load is retried after
+    config.CATALOGUE_RETRY_SECONDS.
+    """
+
+    def __init__(self, threshold: float = None, candidates: int = None):
+        self.threshold = threshold if threshold is not None else config.CATALOGUE_MATCH_THRESHOLD
+        self.candidates = candidates or config.CATALOGUE_CANDIDATES
+        self._records = []        # doc id -> record
+        self._keys = []           # doc id -> normalized strings compared against the OCR text
+        self._grams = []          # doc id -> trigram set
+        self._postings = {}       # trigram -> set of doc ids
+        self._seen = set()        # normalized (titre, auteur) already indexed
+        self._loaded = False
+        self._loading = False
+        self._retry_at = 0.0      # monotonic time before which a failed load is not retried
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._records)
+
+    def start_loading(self) -> None:
+        """Load the index from the database in a background thread, unless loaded, loading or waiting to retry"""
+        with self._lock:
+            if self._loaded or self._loading or time.monotonic() < self._retry_at:
+                return
+            self._loading = True
+        threading.Thread(target=self.load_from_db, name="catalogue-index", daemon=True).start()
+
+    def load_from_db(self) -> bool:
+        """(Re)build the index from the `livres` table; False (index left as is) if the DB is unreachable"""
+        try:
+            import mysql.connector
+            conn = mysql.connector.connect(**config.DB_CONFIG)
+            try:
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute(
+                    "SELECT livre_id, titre, auteur, date_pub, couverture_url, isbn FROM livres"
+                )
+                rows = cursor.fetchall()
+                cursor.close()
+            finally:
+                conn.close()
+        except Exception as e:
+            with self._lock:
+                self._loading = False
+                self._retry_at = time.monotonic() + config.CATALOGUE_RETRY_SECONDS
+            print(f"⚠️  Catalogue index not loaded from DB (retry in {config.CATALOGUE_RETRY_SECONDS:g}s): {e}")
+            return False
+
+        with self._lock:
+            # Books added while the table was read are kept (add skips the duplicates)
+            added = self._records
+            self._records, self._keys, self._grams = [], [], []
+            self._postings, self._seen = {}, set()
+            for row in rows + added:
+                self.add(row)
+            self._loaded, self._loading = True, False
+        print(f"✅ Catalogue index: {len(self._records)} livres indexés")
+        return True
+
+    def add(self, record: dict) -> None:
+        """Index one book (dict with titre, auteur, date_pub, couverture_url, isbn)"""
+        title = normalize_text(record.get("titre"))
+        author = normalize_text(record.get("auteur"))
+        if author == "inconnu":
+            author = ""
+        if len(title) < 3 or _PLACEHOLDER_TITLE.match(title):
+            return
+
+        with self._lock:
+            if (title, author) in self._seen:
+                return
+            self._seen.add((title, author))
+
+            keys = [title]
+            if author:
+                keys += [f"{title} {author}", f"{author} {title}"]
+            grams = _trigrams(f"{title} {author}".strip())
+
+            doc_id = len(self._records)
+            self._records.append(dict(record))
+            self._keys.append(keys)
+            self._grams.append(grams)
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(doc_id)
+
+    def search(self, ocr_text: str):
+        """
+        Find the catalogued book closest to an OCR text
+
+        Returns:
+            (record, score) if the best match reaches the threshold, else None
+        """
+        if not self._loaded:
+            self.start_loading()
+
+        query = normalize_text(ocr_text)
+        if len(query) < 3 or not self._records:
+            return None
+        query_grams = _trigrams(query)
+
+        # 1) Candidates: documents sharing the most trigrams (Dice coefficient)
+        shared = Counter()
+        with self._lock:
+            for gram in query_grams:
+                for doc_id in self._postings.get(gram, ()):
+                    shared[doc_id] += 1
+            scored = [
+                (2 * count / (len(query_grams) + len(self._grams[doc_id])), doc_id)
+                for doc_id, count in shared.items()
+            ]
+            scored.sort(reverse=True)
+            candidates = [(dice, self._records[d], self._keys[d]) for dice, d in scored[:self.candidates]]
+
+        # 2) Re-rank against title / title+author variants (trigram Dice + edit distance)
+        best = None
+        for _, record, keys in candidates:
+            for key in keys:
+                key_grams = _trigrams(key)
+                dice = 2 * len(query_grams & key_grams) / (len(query_grams) + len(key_grams))
+                score = (dice + levenshtein_ratio(query, key)) / 2
+                if best is None or score > best[1]:
+                    best = (record, score)
+
+        if best is None or best[1] < self.threshold:
+            return None
+        return best
+
+    def to_resolution(self, record: dict, score: float) -> dict:
+        """Format a catalogue hit like an agent resolution"""
+        authors = [a.strip() for a in (record.get("auteur") or "").split(",") if a.strip()]
+        authors = [a for a in authors if a != "Inconnu"]
+        cover = record.get("couverture_url")
+        return {
+            "resolved_title": record.get("titre", ""),
+            "confidence": round(score, 4),
+            "reasoning": f"Matched local catalogue entry (similarity {score:.2f})",
+            "google_books_found": False,
+            "google_books_info": {
+                "title": record.get("titre", ""),
+                "authors": authors,
+                "published_date": record.get("date_pub"),
+                "image_links": {"thumbnail": cover} if cover else {},
+                "isbn": record.get("isbn"),
+                "source": "catalogue",
+            },
+            "google_books_verification": (
+                f"📚 Book found in local catalogue (livre_id {record.get('livre_id')})"
+            ),
+        }
+
+
+# Global catalogue index instance (None when disabled)
+catalogue_index = CatalogueIndex() if config.CATALOGUE_INDEX_ENABLED else None
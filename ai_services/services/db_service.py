@@ -0,0 +1,198 @@
+"""Database access for the `livres` table (pooled connections, bulk writes)"""
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+INSERT_COLUMNS = (
+    "biblio_id", "titre", "auteur", "date_pub",
+    "position_ligne", "position_colonne",
+    "couverture_url", "isbn",
+)
+
+
+class BookRepository:
+    """
+    Writes scanned books into `livres`
+
+    By default connections come from a `mysql.connector.pooling` pool built
+    from config.DB_CONFIG. Any DB-API connection factory can be passed
+    instead, e.g. for an SQLite stand-in:
+        BookRepository(connect=lambda: sqlite3.connect(path), placeholder="?")
+    """
+
+    def __init__(self, connect=None, placeholder: str = "%s"):
+        self._connect = connect or self._pooled_connection
+        self.placeholder = placeholder
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _pooled_connection(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    from mysql.connector import pooling
+                    self._pool = pooling.MySQLConnectionPool(
+                        pool_name="biblioscan",
+                        pool_size=config.DB_POOL_SIZE,
+                        **config.DB_CONFIG,
+                    )
+        return self._pool.get_connection()
+
+    @staticmethod
+    def _params(record, biblio_id, ligne, col):
+        return (
+            biblio_id,
+            record.get("titre"),
+            record.get("auteur"),
+            record.get("date_pub"),
+            ligne,
+            col,
+            record.get("cover"),
+            record.get("isbn"),
+        )
+
+    def _insert_many(self, cursor, params: list) -> list:
+        """
+        INSERT the rows one by one (same transaction), returns the new livre_ids in order
+
+        Not executemany: auto-increment IDs of a multi-row INSERT need not be
+        consecutive under concurrent inserts (innodb_autoinc_lock_mode=2), and
+        sqlite3 does not set lastrowid after executemany.
+        """
+        values = ", ".join([self.placeholder] * len(INSERT_COLUMNS))
+        sql = f"INSERT INTO livres ({', '.join(INSERT_COLUMNS)}) VALUES ({values})"
+        ids = []
+        for row in params:
+            cursor.execute(sql, row)
+            ids.append(cursor.lastrowid)
+        return ids
+
+    def _transaction(self, work):
+        """Run work(cursor) in one transaction on a pooled connection"""
+        conn = self._connect()
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            result = work(cursor)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if cursor is not None:
+                cursor.close()
+            conn.close()
+
+    def insert_books(self, rows: list) -> dict:
+        """
+        Insert all the golden records of one scan in a single transaction
+
+        Args:
+            rows: list of (golden_record, biblio_id, ligne, col)
+
+        Returns:
+            {"ids": [livre_id, ...] in input order, "db_time_ms": float}
+        """
+        started = time.perf_counter()
+        if not rows:
+            return {"ids": [], "db_time_ms": 0.0}
+        ids = self._transaction(lambda cursor: self._insert_many(
+            cursor, [self._params(*row) for row in rows]
+        ))
+        return {"ids": ids, "db_time_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    def upsert_books(self, rows: list) -> dict:
+        """
+        Idempotent version of `insert_books`, in a single transaction
+
+        Each row updates the existing book of the same library with the same
+        ISBN (which may have moved), else the book at the same shelf position,
+        else it is inserted. Extra duplicates at a scanned position are
+        deleted. Manually corrected books (correction_manuelle = 1) are kept
+        as they are.
+
+        Returns:
+            {"ids": [...], "inserted": n, "updated": n, "deleted": n, "db_time_ms": float}
+        """
+        started = time.perf_counter()
+        if not rows:
+            return {"ids": [], "inserted": 0, "updated": 0, "deleted": 0, "db_time_ms": 0.0}
+
+        def work(cursor):
+            ph = self.placeholder
+            # Current books of the libraries touched by this scan
+            by_isbn, by_position, manual = {}, {}, set()
+            for biblio_id in {row[1] for row in rows}:
+                cursor.execute(
+                    f"""
+                    SELECT livre_id, isbn, position_ligne, position_colonne, correction_manuelle
+                    FROM livres WHERE biblio_id = {ph} ORDER BY livre_id
+                    """,
+                    (biblio_id,),
+                )
+                for livre_id, isbn, ligne, col, correction in cursor.fetchall():
+                    if isbn:
+                        by_isbn.setdefault((biblio_id, isbn), livre_id)
+                    by_position.setdefault((biblio_id, ligne, col), []).append(livre_id)
+                    if correction:
+                        manual.add(livre_id)
+
+            ids = [None] * len(rows)
+            updates, inserts, insert_slots, claimed, to_delete = [], [], [], set(), []
+            for i, (record, biblio_id, ligne, col) in enumerate(rows):
+                params = self._params(record, biblio_id, ligne, col)
+                isbn = record.get("isbn")
+                at_position = [x for x in by_position.get((biblio_id, ligne, col), []) if x not in claimed]
+                livre_id = by_isbn.get((biblio_id, isbn)) if isbn else None
+                if livre_id in claimed:
+                    livre_id = None
+                if livre_id is None and at_position:
+                    livre_id = at_position[0]
+                if livre_id is None:
+                    inserts.append(params)
+                    insert_slots.append(i)
+                    continue
+                claimed.add(livre_id)
+                ids[i] = livre_id
+                to_delete += [x for x in at_position if x != livre_id and x not in manual]
+                claimed.update(at_position)
+                if livre_id not in manual:
+                    updates.append(params[1:] + (livre_id,))
+
+            if updates:
+                assignments = ", ".join(f"{c} = {ph}" for c in INSERT_COLUMNS[1:])
+                cursor.executemany(f"UPDATE livres SET {assignments} WHERE livre_id = {ph}", updates)
+            if to_delete:
+                cursor.executemany(f"DELETE FROM livres WHERE livre_id = {ph}", [(x,) for x in to_delete])
+            for i, livre_id in zip(insert_slots, self._insert_many(cursor, inserts)):
+                ids[i] = livre_id
+            return {"ids": ids, "inserted": len(inserts), "updated": len(updates), "deleted": len(to_delete)}
+
+        result = self._transaction(work)
+        result["db_time_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    def move_books(self, moves: list) -> dict:
+        """
+        Update the shelf position of existing books, in a single transaction
+
+        Args:
+            moves: list of (livre_id, ligne, col)
+        """
+        started = time.perf_counter()
+        if moves:
+            ph = self.placeholder
+            self._transaction(lambda cursor: cursor.executemany(
+                f"UPDATE livres SET position_ligne = {ph}, position_colonne = {ph} WHERE livre_id = {ph}",
+                [(ligne, col, livre_id) for livre_id, ligne, col in moves],
+            ))
+        return {"moved": len(moves), "db_time_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+
+# Global repository instance
+book_repository = BookRepository()
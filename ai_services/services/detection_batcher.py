@@ -0,0 +1,128 @@
+"""Dynamic micro-batching of YOLO detection across concurrent requests"""
+import os
+import sys
+import time
+import asyncio
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from services.inference_executor import inference_executor
+from services import inference_tasks
+from services.detection_service import DetectionService
+
+# Upper bounds (ms) of the batch latency histogram buckets
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+
+class DetectionBatcher:
+    """
+    Request-coalescing scheduler in front of DetectionService
+
+    Images submitted within `max_wait_ms` of each other (up to `max_batch`)
+    are sent to YOLO as one batch call; each caller gets its own Results.
+    Only requests with the same conf/iou are batched together. One batch
+    runs at a time: images queued meanwhile make up the next one.
+    """
+
+    def __init__(self, max_batch: int = None, max_wait_ms: float = None):
+        self.max_batch = max_batch or config.DETECTION_BATCH_MAX_SIZE
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else config.DETECTION_BATCH_MAX_WAIT_MS) / 1000
+        self._queue = None
+        self._worker = None
+        self.batch_sizes = Counter()                            # batch size -> number of batches
+        self.latency_buckets = Counter()                        # bucket upper bound (ms) -> count
+        self.images = 0
+        self.batches = 0
+
+    async def predict(self, image, conf=None, iou=None):
+        """Queue an image for the next batch and await its Results"""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image, conf, iou, future))
+        return await future
+
+    def _ensure_worker(self):
+        """Start the batching loop in the running event loop (lazily)"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            pending = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(pending) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # One YOLO call per (conf, iou) group, one after the other on the shared model
+            groups = {}
+            for item in pending:
+                groups.setdefault((item[1], item[2]), []).append(item)
+            for (conf, iou), items in groups.items():
+                await self._run_batch(items, conf, iou)
+
+    async def _run_batch(self, items, conf, iou):
+        started = time.perf_counter()
+        try:
+            results = await inference_executor.run(
+                inference_tasks.detect_batch, [item[0] for item in items], conf=conf, iou=iou
+            )
+        except Exception as e:
+            for item in items:
+                if not item[3].done():
+                    item[3].set_exception(e)
+            return
+        for item, result in zip(items, results):
+            if not item[3].done():
+                item[3].set_result(result)
+        self._observe(len(items), (time.perf_counter() - started) * 1000)
+
+    def _observe(self, size, latency_ms):
+        self.batches += 1
+        self.images += size
+        self.batch_sizes[size] += 1
+        bucket = next(b for b in LATENCY_BUCKETS_MS if latency_ms <= b)
+        self.latency_buckets[bucket] += 1
+
+    def stats(self) -> dict:
+        """Batch size and latency histograms"""
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "images": self.images,
+            "avg_batch_size": round(self.images / self.batches, 2) if self.batches else 0.0,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+            "latency_ms_histogram": {
+                ("+Inf" if b == float("inf") else str(b)): self.latency_buckets.get(b, 0)
+                for b in LATENCY_BUCKETS_MS
+            },
+        }
+
+
+# Global batcher instance
+detection_batcher = DetectionBatcher()
+
+
+async def detect(image, conf=None, iou=None):
+    """
+    Detect books in one image, through the batcher when enabled
+
+    Panoramic images bypass the batcher: their tiles already make a batch
+    of their own (up to config.DETECTION_MAX_TILES images), which would
+    overflow max_batch if merged with queued requests. The tiled call still
+    waits for the model like the batches do (DetectionService lock).
+    """
+    if DetectionService.needs_tiling(image):
+        return await inference_executor.run(inference_tasks.detect_tiled, image, conf=conf, iou=iou)
+    if config.DETECTION_BATCHING:
+        return await detection_batcher.predict(image, conf=conf, iou=iou)
+    return await inference_executor.run(inference_tasks.detect, image, conf=conf, iou=iou)
@@ -1,33 +1,129 @@
 """Detection service for book detection using YOLO"""
-from ultralytics import YOLO
 import sys
 import os
+import threading
+import numpy as np
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from utils.image_utils import tile_grid, nms
+
+# Distance (px) to a tile edge under which a box may be a spine cut by the seam
+_TILE_EDGE_MARGIN = 2
 
 class DetectionService:
     """Service for handling book detection"""
     
-    def __init__(self):
-        print(f" Device : {config.DEVICE}")
-        self.model = YOLO(config.MODEL_PATH)
-        self.model.to(config.DEVICE)
-        print(f" YOLO chargé depuis {config.MODEL_PATH}")
+    def __init__(self, backend=None, precision=None):
+        self.backend = backend or config.DETECTION_BACKEND
+        self.precision = precision or config.DETECTION_PRECISION
+        if self.backend not in config.DETECTION_MODEL_PATHS:
+            raise ValueError(f"Unknown detection backend: {self.backend}")
+        if self.precision == "int8":
+            if self.backend not in config.DETECTION_INT8_MODEL_PATHS:
+                raise ValueError(f"INT8 detection needs the onnx or openvino backend, not {self.backend}")
+            self.model_path = config.DETECTION_INT8_MODEL_PATHS[self.backend]
+        else:
+            self.model_path = config.DETECTION_MODEL_PATHS[self.backend]
+        # OpenVINO IR only runs on CPU here; ONNX Runtime picks CUDA if available
+        self.device = "cpu" if self.backend == "openvino" else config.DEVICE
+        print(f" Device : {self.device}")
+        from ultralytics import YOLO  # deferred: pulls in torch
+        self.model = YOLO(self.model_path, task="detect")
+        if self.backend == "pytorch":
+            self.model.to(self.device)
+        print(f" YOLO ({self.backend}, {self.precision}) chargé depuis {self.model_path}")
+        # Ultralytics predictors are not thread-safe: the inference threads share this model
+        self._predict_lock = threading.Lock()
     
     def predict(self, image, conf=None, iou=None, imgsz=None):
         """Run YOLO detection on an image"""
         conf = conf or config.DEFAULT_CONF
         iou = iou or config.DEFAULT_IOU
         imgsz = imgsz or config.DEFAULT_IMGSZ
-        return self.model.predict(
-            image, 
-            conf=conf, 
-            iou=iou, 
-            imgsz=imgsz, 
-            device=config.DEVICE, 
-            verbose=False
-        )[0]
+        with self._predict_lock:
+            return self.model.predict(
+                image, 
+                conf=conf, 
+                iou=iou, 
+                imgsz=imgsz, 
+                device=self.device, 
+                verbose=False
+            )[0]
+    
+    def predict_batch(self, images, conf=None, iou=None, imgsz=None):
+        """Run YOLO detection on several images in one forward pass (one Results per image)"""
+        conf = conf or config.DEFAULT_CONF
+        iou = iou or config.DEFAULT_IOU
+        imgsz = imgsz or config.DEFAULT_IMGSZ
+        with self._predict_lock:
+            return list(self.model.predict(
+                list(images), 
+                conf=conf, 
+                iou=iou, 
+                imgsz=imgsz, 
+                device=self.device, 
+                verbose=False
+            ))
+    
+    @staticmethod
+    def needs_tiling(image) -> bool:
+        """Whether an image is elongated enough for tiled detection (panoramic shelf photo)"""
+        height, width = image.shape[:2]
+        return config.DETECTION_TILING and max(width, height) >= config.DETECTION_TILING_MIN_ASPECT * min(width, height)
+    
+    def predict_tiled(self, image, conf=None, iou=None, imgsz=None):
+        """
+        Run YOLO on overlapping tiles of a large image, as one Results for the whole image
+
+        Squashing a 4000 px wide shelf to imgsz leaves thin spines a few
+        pixels wide; each tile is resized on its own instead. All tiles go
+        through YOLO in one batch, their boxes are shifted back to image
+        coordinates and merged with NMS on the intersection over the smaller
+        box. Boxes touching an inner tile edge rank below the others, so a
+        spine cut by a seam is kept from the tile where it is whole.
+        """
+        import torch
+        from ultralytics.engine.results import Results
+        height, width = image.shape[:2]
+        tiles = tile_grid(width, height, config.DETECTION_TILE_MIN_SIZE,
+                          config.DETECTION_TILE_OVERLAP, config.DETECTION_MAX_TILES)
+        if len(tiles) == 1:
+            return self.predict(image, conf=conf, iou=iou, imgsz=imgsz)
+        results = self.predict_batch(
+            [np.ascontiguousarray(image[y1:y2, x1:x2]) for x1, y1, x2, y2 in tiles],
+            conf=conf, iou=iou, imgsz=imgsz
+        )
+        
+        boxes, scores, classes, cut = [], [], [], []
+        for (x1, y1, x2, y2), result in zip(tiles, results):
+            xyxy = result.boxes.xyxy.cpu().numpy().reshape(-1, 4)
+            cut.append(
+                ((xyxy[:, 0] <= _TILE_EDGE_MARGIN) & (x1 > 0))
+                | ((xyxy[:, 2] >= x2 - x1 - _TILE_EDGE_MARGIN) & (x2 < width))
+                | ((xyxy[:, 1] <= _TILE_EDGE_MARGIN) & (y1 > 0))
+                | ((xyxy[:, 3] >= y2 - y1 - _TILE_EDGE_MARGIN) & (y2 < height))
+            )
+            boxes.append(xyxy + np.array([x1, y1, x1, y1], dtype=xyxy.dtype))
+            scores.append(result.boxes.conf.cpu().numpy())
+            classes.append(result.boxes.cls.cpu().numpy())
+        boxes, scores, classes, cut = (np.concatenate(a) for a in (boxes, scores, classes, cut))
+        
+        keep = nms(boxes, scores - cut, config.DETECTION_TILE_MERGE_THRESHOLD, classes=classes, metric="ios")
+        data = np.column_stack([boxes[keep], scores[keep], classes[keep]]).astype(np.float32).reshape(-1, 6)
+        # Boxes must be a tensor, like YOLO's own results (callers use .cpu())
+        return Results(image, path="", names=results[0].names, boxes=torch.from_numpy(data))
+
+# Global detection service instance, created on first use (model loading is slow)
+_detection_service = None
+_lock = threading.Lock()
+
 
-# Global detection service instance
-detection_service = DetectionService()
+def get_detection_service() -> DetectionService:
+    """Return the shared DetectionService, loading the model on first call"""
+    global _detection_service
+    if _detection_service is None:
+        with _lock:
+            if _detection_service is None:
+                _detection_service = DetectionService()
+    return _detection_service
 
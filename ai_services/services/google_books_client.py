@@ -0,0 +1,203 @@
+"""Shared Google Books API client (pooled session, cache, retries)"""
+import os
+import sys
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from email.utils import parsedate_to_datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from services.metrics import cache_events
+
+# Status codes worth retrying (quota exceeded / transient server errors)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _default_transport():
+    """requests.Session with a connection pool sized for concurrent lookups"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=config.GOOGLE_BOOKS_POOL_SIZE,
+        pool_maxsize=config.GOOGLE_BOOKS_POOL_SIZE,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _retry_after_seconds(value):
+    """Parse a Retry-After header (delay in seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class GoogleBooksClient:
+    """
+    Client for the Google Books `volumes` endpoint
+
+    - one pooled HTTP session shared by every caller
+    - responses cached by normalized query (TTL + LRU eviction)
+    - identical queries in flight at the same time are sent only once
+    - 429 / 5xx retried with backoff, honouring Retry-After
+
+    `transport` is any object with a `requests`-like `get(url, params=, timeout=)`
+    method, so the client can be pointed at a local stub server.
+    """
+
+    def __init__(self, transport=None, base_url: str = None, api_key: str = None,
+                 timeout: float = None, ttl: int = None, max_entries: int = None,
+                 max_retries: int = None, backoff: float = None, max_backoff: float = None):
+        self.transport = transport or _default_transport()
+        self.base_url = base_url or config.GOOGLE_BOOKS_URL
+        self.api_key = api_key if api_key is not None else config.GOOGLE_BOOKS_API_KEY
+        self.timeout = timeout or config.GOOGLE_BOOKS_TIMEOUT
+        self.ttl = ttl if ttl is not None else config.GOOGLE_BOOKS_CACHE_TTL
+        self.max_entries = max_entries if max_entries is not None else config.GOOGLE_BOOKS_CACHE_MAX_ENTRIES
+        self.max_retries = max_retries if max_retries is not None else config.GOOGLE_BOOKS_MAX_RETRIES
+        self.backoff = backoff if backoff is not None else config.GOOGLE_BOOKS_BACKOFF
+        self.max_backoff = max_backoff if max_backoff is not None else config.GOOGLE_BOOKS_MAX_BACKOFF
+
+        self._cache = OrderedDict()   # key -> (expires_at, data)
+        self._in_flight = {}          # key -> Future
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.retries = 0
+
+    @staticmethod
+    def make_key(params: dict) -> tuple:
+        """Cache key: normalized query + the other parameters (API key excluded)"""
+        query = " ".join(str(params.get("q", "")).casefold().split())
+        others = tuple(sorted((k, str(v)) for k, v in params.items() if k not in ("q", "key")))
+        return (query,) + others
+
+    def search(self, query: str, max_results: int = 5, **params) -> dict:
+        """
+        Search volumes and return the decoded JSON response
+
+        Extra keyword arguments are passed as query parameters
+        (e.g. langRestrict="fr"). Raises on HTTP errors once retries are exhausted.
+        """
+        params = {"q": query, "maxResults": max_results, **params}
+        if self.api_key and "key" not in params:
+            params["key"] = self.api_key
+        key = self.make_key(params)
+
+        with self._lock:
+            cached = self._cache_get(key)
+            if cached is not None:
+                self.hits += 1
+                cache_events.inc(cache="google_books", outcome="hit")
+                return cached
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                cache_events.inc(cache="google_books", outcome="miss")
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self.coalesced += 1
+                cache_events.inc(cache="google_books", outcome="coalesced")
+
+        if not owner:
+            return future.result()
+
+        try:
+            data = self._fetch(params)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(data)
+            with self._lock:
+                self._cache_set(key, data)
+            return data
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _fetch(self, params: dict) -> dict:
+        """GET with retries on quota / transient errors"""
+        attempt = 0
+        while True:
+            try:
+                response = self.transport.get(self.base_url, params=params, timeout=self.timeout)
+            except Exception:
+                if attempt >= self.max_retries:
+                    raise
+                delay = None
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return response.json()
+                delay = _retry_after_seconds(response.headers.get("Retry-After"))
+
+            if delay is None:
+                delay = self.backoff * (2 ** attempt)
+            attempt += 1
+            self.retries += 1
+            time.sleep(min(delay, self.max_backoff))
+
+    def _cache_get(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if self.ttl and time.time() > expires_at:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return data
+
+    def _cache_set(self, key, data) -> None:
+        self._cache[key] = (time.time() + self.ttl, data)
+        self._cache.move_to_end(key)
+        while self.max_entries and len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def clear_cache(self) -> None:
+        """Drop every cached response"""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        """Cache and retry counters"""
+        with self._lock:
+            entries = len(self._cache)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "entries": entries,
+        }
+
+
+# Global client instance (lazy initialization)
+_client_instance = None
+_client_lock = threading.Lock()
+
+
+def get_google_books_client() -> GoogleBooksClient:
+    """Get or create the shared Google Books client"""
+    global _client_instance
+    if _client_instance is None:
+        with _client_lock:
+            if _client_instance is None:
+                _client_instance = GoogleBooksClient()
+    return _client_instance
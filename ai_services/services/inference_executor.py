@@ -0,0 +1,96 @@
+"""Dedicated executor for blocking inference (YOLO, OCR) off the asyncio event loop"""
+import os
+import sys
+import time
+import asyncio
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+
+def _timed_call(fn, args, kwargs):
+    """Run fn in the worker and report when it started/finished (wall clock)"""
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return started, time.time(), result
+
+
+class InferenceExecutor:
+    """
+    Thread or process pool for heavy inference calls
+
+    Routes `await executor.run(fn, ...)` instead of calling the model
+    directly, so the event loop keeps serving light endpoints while scans
+    run. In "process" mode `fn` must be picklable (a module-level function,
+    see services/inference_tasks.py); each worker loads its own models.
+    """
+
+    def __init__(self, kind: str = None, workers: int = None):
+        self.kind = kind or config.INFERENCE_EXECUTOR
+        self.workers = workers or config.INFERENCE_WORKERS
+        if self.kind == "process":
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self.pending = 0        # submitted, not finished yet
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0   # seconds spent queued before a worker picked the task
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    async def run(self, fn, *args, **kwargs):
+        """Submit fn(*args, **kwargs) to the pool and await its result"""
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        with self._lock:
+            self.pending += 1
+        try:
+            started, finished, result = await loop.run_in_executor(
+                self._pool, functools.partial(_timed_call, fn, args, kwargs)
+            )
+        except Exception:
+            with self._lock:
+                self.pending -= 1
+                self.failed += 1
+            raise
+        wait = max(0.0, started - submitted)
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.total_run += finished - started
+        return result
+
+    @property
+    def queue_depth(self) -> int:
+        """Tasks waiting for a free worker"""
+        return max(0, self.pending - self.workers)
+
+    def stats(self) -> dict:
+        """Queue depth and wait/run time metrics"""
+        with self._lock:
+            done = self.completed or 1
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "pending": self.pending,
+                "queue_depth": self.queue_depth,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_wait_ms": round(self.total_wait / done * 1000, 2),
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "avg_run_ms": round(self.total_run / done * 1000, 2),
+            }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+# Global inference executor instance
+inference_executor = InferenceExecutor()
@@ -0,0 +1,59 @@
+"""Module-level inference entry points submitted to the inference executor
+
+Plain functions (not bound methods) so they can be pickled when the
+executor runs in process mode; each worker uses its own service instances.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.detection_service import get_detection_service
+from services.ocr_service import get_ocr_service
+
+
+def detect(image, conf=None, iou=None):
+    """YOLO detection on one image"""
+    return get_detection_service().predict(image, conf=conf, iou=iou)
+
+
+def detect_batch(images, conf=None, iou=None):
+    """YOLO detection on several images in one batch"""
+    return get_detection_service().predict_batch(images, conf=conf, iou=iou)
+
+
+def detect_tiled(image, conf=None, iou=None):
+    """YOLO detection on the overlapping tiles of a panoramic image (one batch)"""
+    return get_detection_service().predict_tiled(image, conf=conf, iou=iou)
+
+
+def ocr_batch(images):
+    """Batched OCR on a list of crops"""
+    return get_ocr_service().predict_batch(images)
+
+
+def ocr_available() -> bool:
+    """Whether PaddleOCR could be loaded in this worker"""
+    return get_ocr_service()._available
+
+
+def warmup() -> dict:
+    """
+    Load the models of this worker and run one inference through each
+
+    The first call of a model is much slower than the next ones (lazy
+    initialisation, CUDA context, memory allocation), so it is paid here
+    rather than by the first request. Returns the seconds spent per model.
+    """
+    timings = {}
+    started = time.perf_counter()
+    detect(np.zeros((640, 640, 3), dtype=np.uint8))
+    timings["detection"] = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    if ocr_available():
+        ocr_batch([np.full((320, 48, 3), 255, dtype=np.uint8)])
+    timings["ocr"] = round(time.perf_counter() - started, 3)
+    return timings
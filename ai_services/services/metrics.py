@@ -0,0 +1,180 @@
+"""Per-stage timings and Prometheus metrics (text exposition format, no extra dependency)"""
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Seconds; same spread as the detection batcher's latency histogram
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+# Stages timed inside a request (see `timed`)
+STAGES = ("decode", "yolo", "crop", "prefilter", "ocr", "ocr_per_book", "llm", "google_books", "db", "artifacts")
+# Background stage (artifact writer thread), histogram only
+ARTIFACT_WRITE_STAGE = "artifact_write"
+
+# Timings of the current request ({stage: seconds}), set by the HTTP middleware
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def _format_value(value):
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name, self.help, self.label_names = name, help_text, label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple((k, labels[k]) for k in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Value set directly, or read from `source()` at scrape time"""
+
+    def __init__(self, name, help_text, label_names=(), source=None):
+        super().__init__(name, help_text, label_names)
+        self.source = source
+
+    def set(self, value, **labels):
+        key = tuple((k, labels[k]) for k in self.label_names)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        if self.source is not None:
+            self.set(self.source())
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=STAGE_BUCKETS):
+        self.name, self.help, self.label_names, self.buckets = name, help_text, label_names, buckets
+        self._series = {}   # labels -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple((k, labels[k]) for k in self.label_names)
+        with self._lock:
+            counts, total, count = self._series.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._series[key] = [counts, total + value, count + 1]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    labels = _format_labels(key + (("le", _format_value(bound)),))
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total!r}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+stage_seconds = registry.register(Histogram(
+    "biblioscan_stage_seconds", "Duration of one pipeline stage", ("stage",)))
+request_seconds = registry.register(Histogram(
+    "biblioscan_request_seconds", "HTTP request duration", ("path", "status")))
+in_flight_requests = registry.register(Gauge(
+    "biblioscan_in_flight_requests", "HTTP requests being served"))
+cache_events = registry.register(Counter(
+    "biblioscan_cache_events_total", "Cache lookups by cache and outcome", ("cache", "outcome")))
+ocr_failures = registry.register(Counter(
+    "biblioscan_ocr_failures_total", "OCR batches that failed or were unavailable"))
+ocr_prefilter = registry.register(Counter(
+    "biblioscan_ocr_prefilter_total", "Crops checked before OCR: passed, or the reason they were skipped",
+    ("outcome",)))
+llm_errors = registry.register(Counter(
+    "biblioscan_llm_errors_total", "LLM calls that raised"))
+llm_requests = registry.register(Counter(
+    "biblioscan_llm_requests_total", "LLM calls by mode (one book, or a shelf batch)", ("mode",)))
+llm_tokens = registry.register(Counter(
+    "biblioscan_llm_tokens_total", "LLM tokens reported by the provider", ("mode", "direction")))
+llm_batch_fallbacks = registry.register(Counter(
+    "biblioscan_llm_batch_fallbacks_total", "Shelf-batch entries re-resolved one by one (invalid or missing)"))
+books_processed = registry.register(Counter(
+    "biblioscan_books_total", "Detected books by how they were processed", ("outcome",)))
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """Record a stage duration in the histogram and in the current request's timings"""
+    stage_seconds.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        with timings["lock"]:
+            timings["stages"][stage] = timings["stages"].get(stage, 0.0) + seconds
+            timings["calls"][stage] = timings["calls"].get(stage, 0) + 1
+
+
+@contextmanager
+def timed(stage: str):
+    """`with timed("yolo"): ...` records the duration of the block"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def start_request():
+    """Start collecting the timings of the current request (HTTP middleware)"""
+    return _request_timings.set({"lock": threading.Lock(), "stages": {}, "calls": {}, "started": time.perf_counter()})
+
+
+def end_request(token) -> None:
+    _request_timings.reset(token)
+
+
+def current_timings():
+    """
+    {"total_ms", "stages_ms": {stage: ms}, "calls": {stage: n}} for the current request
+
+    Durations are summed over the calls of a stage (mean = stages_ms / calls);
+    stages running concurrently (e.g. one LLM call per book) can exceed the total.
+    """
+    timings = _request_timings.get()
+    if timings is None:
+        return None
+    with timings["lock"]:
+        return {
+            "total_ms": round((time.perf_counter() - timings["started"]) * 1000, 2),
+            "stages_ms": {s: round(v * 1000, 2) for s, v in timings["stages"].items()},
+            "calls": dict(timings["calls"]),
+        }
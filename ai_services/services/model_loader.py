@@ -0,0 +1,85 @@
+"""Background loading and warm-up of the inference models (readiness of the service)"""
+import os
+import sys
+import time
+import asyncio
+import threading
+
+from fastapi import HTTPException
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from services.inference_executor import inference_executor
+from services import inference_tasks
+
+STATES = ("pending", "loading", "ready", "failed")
+
+
+class ModelLoader:
+    """
+    Loads YOLO and PaddleOCR after startup instead of at import time
+
+    `start()` (FastAPI startup hook) schedules one warm-up inference per
+    executor worker and returns immediately, so the process answers
+    /healthz at once; the service is ready when every warm-up succeeded.
+    In process mode the pool decides which worker runs each warm-up, a
+    worker left cold loads its models on its first request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._task = None
+        self.state = "pending"
+        self.error = None
+        self.started_at = None
+        self.load_seconds = None
+        self.warmup = []        # per worker: {"detection": s, "ocr": s}
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def start(self):
+        """Schedule the loading on the running event loop (idempotent)"""
+        with self._lock:
+            if self._task is None:
+                self._task = asyncio.get_running_loop().create_task(self._load())
+        return self._task
+
+    async def _load(self):
+        self.state, self.started_at = "loading", time.time()
+        print(" Chargement des modèles en arrière-plan...")
+        started = time.perf_counter()
+        try:
+            self.warmup = await asyncio.gather(
+                *(inference_executor.run(inference_tasks.warmup) for _ in range(inference_executor.workers))
+            )
+        except Exception as e:
+            self.state, self.error = "failed", f"{type(e).__name__}: {e}"
+            print(f"❌ Échec du chargement des modèles : {self.error}")
+            return
+        self.load_seconds = round(time.perf_counter() - started, 3)
+        self.state = "ready"
+        print(f"✅ Modèles prêts en {self.load_seconds}s")
+
+    def status(self) -> dict:
+        return {
+            "status": self.state,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup,
+        }
+
+
+# Global loader instance
+model_loader = ModelLoader()
+
+
+def require_models():
+    """Route dependency: 503 + Retry-After until the models are warm"""
+    if not model_loader.ready:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Models are not ready ({model_loader.state})",
+            headers={"Retry-After": str(config.MODEL_LOADING_RETRY_AFTER)},
+        )
@@ -1,9 +1,9 @@
 """OCR service for text recognition"""
 import sys
 import os
+import threading
+import numpy as np
 
-# IMPORTANT: Patch langchain.docstore BEFORE any other imports
-# This must happen before PaddleOCR tries to import it
 from types import ModuleType
 
 # Create mock langchain modules for PaddleOCR compatibility
@@ -44,26 +44,40 @@ def _create_mock_langchain_modules():
         text_splitter_module.CharacterTextSplitter = TextSplitter
         text_splitter_module.RecursiveCharacterTextSplitter = RecursiveCharacterTextSplitter
 
-# Create the mock modules
-::_create_mock_langchain_modules()
-
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from utils.image_utils import crop_text_region, sort_text_boxes
+from utils.preprocessing import prepare_crops
 
 
 class OCRService:
     """Service for handling OCR operations"""
     
-    def __init__(self):
-        # Lazy import to avoid issues at module load time
+    def __init__(self, precision=None):
+        self.precision = precision or config.OCR_PRECISION
+        self.textline_orientation = config.OCR_TEXTLINE_ORIENTATION
+        # Crop preprocessing of this backend: {"height", "color"} (see utils/preprocessing.py)
+        self.preprocessing = dict(config.OCR_PREPROCESSING.get(self.precision, {}))
+        # PaddleOCR predictors are not thread-safe: the inference threads share this instance
+        self._ocr_lock = threading.Lock()
+        # Lazy import to avoid issues at module load time; the langchain
+        # modules PaddleOCR expects must be patched in before it is imported
+        _create_mock_langchain_modules()
         try:
             from paddleocr import PaddleOCR
             print(" Initialisation PaddleOCR...")
+            options = {}
+            if self.precision == "int8":
+                # Quantized recognizer produced by quantize_models.py
+                options["rec_model_dir"] = config.OCR_REC_INT8_DIR
             self.ocr = PaddleOCR(
                 lang=config.OCR_LANGUAGE,
-                use_textline_orientation=True,  # Handles rotated text (important for book spines)
+                # Spines are turned to horizontal reading from their geometry (see predict_batch);
+                # the 2.x angle classifier only loads when it is used (cls= in the ocr() calls)
+                use_angle_cls=self.textline_orientation,
+                **options,
             )
-            print(f" PaddleOCR chargé (GPU: {config.DEVICE == 'cuda'}, Lang: {config.OCR_LANGUAGE})")
+            print(f" PaddleOCR chargé (GPU: {config.DEVICE == 'cuda'}, Lang: {config.OCR_LANGUAGE}, Rec: {self.precision})")
             self._available = True
         except (ImportError, ModuleNotFoundError) as e:
             error_msg = str(e)
@@ -92,71 +106,107 @@ class OCRService:
             "rec_polys": [ [[x1,y1],...], ... ]
         }
         """
+        return self.predict_batch([image])[0]
+
+    def predict_batch(self, images, batch_size=None):
+        """
+        Run OCR on several crops at once.
+
+        Crops are first preprocessed as one batch (turned to horizontal
+        reading from their geometry, resized to a fixed height, see
+        self.preprocessing); text lines are detected crop by crop, then every
+        line of every crop goes through the recognizer in batches of
+        `batch_size` (config.OCR_BATCH_SIZE by default). Without the
+        orientation classifier, lines read with a confidence below
+        config.OCR_FLIP_MIN_CONFIDENCE are read again flipped 180° and the
+        better reading is kept. Polygons are in the original crop's frame.
+
+        Retourne une liste de dicts (un par image, même ordre), au même
+        format que `predict`.
+        """
         if not self._available or self.ocr is None:
             raise RuntimeError("PaddleOCR is not available. Please install required dependencies.")
-        
-        # Appel PaddleOCR
-        result = self.ocr.ocr(image, cls=True)
-
-        rec_texts = []
-        rec_scores = []
-        rec_polys = []
-
-        if result is None:
-            # Sécurité maximale : aucun texte
-            print("⚠ PaddleOCR a retourné None")
-            return {
-                "rec_texts": [],
-                "rec_scores": [],
-                "rec_polys": [],
-            }
-
-        # result est typiquement : [ [ [box, (text, score)], ... ] ]
-        for line in result or []:
-            if not line:
-                continue
-            # line doit être une liste de items
-            for item in (line or []):
-                # item = [box, (text, score)]
-                if not item or len(item) < 2:
-                    continue
-                box = item[0]
-                rec = item[1]
 
-                if box is None or rec is None:
-                    continue
+        batch_size = batch_size or config.OCR_BATCH_SIZE
+        outputs = [
+            {"rec_texts": [], "rec_scores": [], "rec_polys": []}
+            for _ in images
+        ]
+
+        # 1) Prétraitement (redressement, hauteur fixe) puis détection des lignes de texte sur chaque crop
+        batch = prepare_crops(images, direction=config.SPINE_TEXT_DIRECTION, **self.preprocessing)
+        lines = []  # (index image, polygone dans le crop d'origine, image de la ligne)
+        for image_idx in range(len(batch)):
+            upright = batch.crop(image_idx)
+            if upright is None:
+                continue
+            with self._ocr_lock:
+                det = self.ocr.ocr(upright, rec=False, cls=False)
+            boxes = det[0] if det else None
+            for box in sort_text_boxes(boxes or []):
+                poly = np.asarray(box, dtype=np.float32)
+                lines.append((image_idx, batch.to_original(image_idx, poly), crop_text_region(upright, poly)))
+
+        # 2) Reconnaissance par lots sur toutes les lignes de tous les crops
+        readings = self._recognize([line[2] for line in lines], batch_size)
+
+        # 3) Lignes peu sûres : relecture retournée à 180° (au lieu du classifieur d'orientation)
+        if not self.textline_orientation:
+            doubtful = [i for i, reading in enumerate(readings)
+                        if reading is None or reading[1] < config.OCR_FLIP_MIN_CONFIDENCE]
+            flipped = self._recognize([np.rot90(lines[i][2], 2) for i in doubtful], batch_size)
+            for i, reading in zip(doubtful, flipped):
+                if reading is not None and (readings[i] is None or reading[1] > readings[i][1]):
+                    readings[i] = reading
+
+        for (image_idx, poly, _), reading in zip(lines, readings):
+            if reading is None:
+                continue
+            outputs[image_idx]["rec_polys"].append(poly)
+            outputs[image_idx]["rec_texts"].append(reading[0])
+            outputs[image_idx]["rec_scores"].append(reading[1])
 
-                # rec = (text, score)
-                if not isinstance(rec, (list, tuple)) or len(rec) < 2:
-                    continue
+        return outputs
 
-                text, score = rec[0], rec[1]
+    def _recognize(self, line_images, batch_size):
+        """
+        Recognizer on text line images, in batches: (text, score) or None per line
 
-                # Filtre minimal
-                if text is None:
+        The classifier / recognizer of PaddleOCR 2.7 are called directly:
+        ocr(list, det=False) treats each line as a page of its own (one
+        result per line, page count fixed by the first call).
+        """
+        readings = []
+        for start in range(0, len(line_images), batch_size):
+            chunk = line_images[start:start + batch_size]
+            with self._ocr_lock:
+                if self.textline_orientation:
+                    chunk, _, _ = self.ocr.text_classifier(chunk)
+                rec_res, _ = self.ocr.text_recognizer(chunk)
+            rec_res = rec_res or []
+            for idx in range(len(chunk)):
+                rec = rec_res[idx] if idx < len(rec_res) else None
+                if not isinstance(rec, (list, tuple)) or len(rec) < 2 or rec[0] is None:
+                    readings.append(None)
                     continue
-
                 try:
-                    score_f = float(score)
+                    score_f = float(rec[1])
                 except Exception:
                     score_f = 0.0
+                readings.append((str(rec[0]), score_f))
+        return readings
 
-                rec_polys.append(box)
-                rec_texts.append(str(text))
-                rec_scores.append(score_f)
 
-        return {
-            "rec_texts": rec_texts,
-            "rec_scores": rec_scores,
-            "rec_polys": rec_polys,
-        }
+# Global OCR service instance, created on first use (PaddleOCR loading is slow)
+_ocr_service = None
+_lock = threading.Lock()
 
 
-# Global OCR service instance
-try:
-    ocr_service = OCRService()
-except Exception as e:
-    print(f" ⚠️  Warning: Could not initialize OCR service: {e}")
-    # Create a dummy instance to prevent import errors
-    ocr_service = OCRService()
-    ocr_service._available = False
+def get_ocr_service() -> OCRService:
+    """Return the shared OCRService, loading PaddleOCR on first call"""
+    global _ocr_service
+    if _ocr_service is None:
+        with _lock:
+            if _ocr_service is None:
+                _ocr_service = OCRService()
+    return _ocr_service
@@ -0,0 +1,142 @@
+"""Persistent cache for OCR text -> resolved title lookups (SQLite)"""
+import os
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from utils.ocr_utils import normalize_text
+
+
+class ResolutionCache:
+    """
+    SQLite cache of agent resolutions
+
+    Entries are keyed on (normalized OCR text, LLM provider, LLM model),
+    expire after `ttl` seconds and are evicted least-recently-used first
+    once the cache holds more than `max_entries` rows.
+    """
+
+    def __init__(self, path: str = None, ttl: int = None, max_entries: int = None):
+        self.path = path or config.RESOLUTION_CACHE_PATH
+        self.ttl = ttl if ttl is not None else config.RESOLUTION_CACHE_TTL
+        self.max_entries = max_entries if max_entries is not None else config.RESOLUTION_CACHE_MAX_ENTRIES
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS resolutions (
+                key TEXT PRIMARY KEY,
+                ocr_text TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_resolutions_last_access ON resolutions (last_access)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(ocr_text: str, provider: str, model: str) -> str:
+        """Cache key for an OCR text and an LLM provider/model"""
+        raw = f"{provider}|{model}|{normalize_text(ocr_text)}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, ocr_text: str, provider: str, model: str):
+        """Return the cached resolution dict, or None on a miss"""
+        key = self.make_key(ocr_text, provider, model)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, created_at FROM resolutions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            result, created_at = row
+            if self.ttl and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM resolutions WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE resolutions SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(result)
+
+    def set(self, ocr_text: str, provider: str, model: str, result: dict) -> None:
+        """Store a resolution (resolved_title, confidence, google_books_info, ...)"""
+        key = self.make_key(ocr_text, provider, model)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO resolutions
+                  (key, ocr_text, provider, model, result, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, ocr_text, provider, model, json.dumps(result), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop expired entries, then least recently used ones above max_entries"""
+        if self.ttl:
+            self._conn.execute(
+                "DELETE FROM resolutions WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+        if self.max_entries:
+            self._conn.execute(
+                """
+                DELETE FROM resolutions WHERE key IN (
+                    SELECT key FROM resolutions
+                    ORDER BY last_access DESC
+                    LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        """Remove every entry and reset the counters"""
+        with self._lock:
+            self._conn.execute("DELETE FROM resolutions")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM resolutions").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+        }
+
+
+# Global cache instance (None when disabled)
+resolution_cache = ResolutionCache() if config.RESOLUTION_CACHE_ENABLED else None
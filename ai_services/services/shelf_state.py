@@ -0,0 +1,211 @@
+"""Last known state of each shelf position (crop hash, geometry, OCR, livre_id, agent result)"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from utils.image_utils import hamming_distance
+
+# Columns added after the first version of the table (migrated in place)
+_EXTRA_COLUMNS = {"width": "INTEGER", "height": "INTEGER", "ocr_result": "TEXT"}
+
+
+def _dump_ocr(ocr_result):
+    """JSON-safe copy of a predict_batch result (numpy polygons and scores)"""
+    if not ocr_result:
+        return None
+    return {
+        "rec_texts": list(ocr_result.get("rec_texts", [])),
+        "rec_scores": [float(s) for s in ocr_result.get("rec_scores", [])],
+        "rec_polys": [np.asarray(p).tolist() for p in ocr_result.get("rec_polys", [])],
+    }
+
+
+def _load_ocr(ocr_result):
+    if not ocr_result:
+        return None
+    ocr_result["rec_polys"] = [np.asarray(p, dtype=np.float32) for p in ocr_result["rec_polys"]]
+    return ocr_result
+
+
+class ShelfStateStore:
+    """
+    SQLite store keyed on (biblio_id, position_ligne, position_colonne)
+
+    Lets a re-scan recognise spines it has already seen on the same shelf
+    row (dHash + box size) and reuse the previous OCR, agent result and
+    livre_id instead of redoing PaddleOCR, the LLM, Google Books and the
+    database work.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or config.SHELF_STATE_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS shelf_positions (
+                biblio_id INTEGER NOT NULL,
+                position_ligne INTEGER NOT NULL,
+                position_colonne INTEGER NOT NULL,
+                crop_hash TEXT NOT NULL,
+                livre_id INTEGER,
+                agent_result TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                width INTEGER,
+                height INTEGER,
+                ocr_result TEXT,
+                PRIMARY KEY (biblio_id, position_ligne, position_colonne)
+            )
+            """
+        )
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(shelf_positions)")}
+        for column, kind in _EXTRA_COLUMNS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE shelf_positions ADD COLUMN {column} {kind}")
+        self._conn.commit()
+
+    def get_row(self, biblio_id: int, ligne: int) -> dict:
+        """
+        {position_colonne: {"crop_hash", "width", "height", "ocr_result",
+        "livre_id", "agent_result"}} for one shelf row
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT position_colonne, crop_hash, width, height, ocr_result, livre_id, agent_result
+                FROM shelf_positions WHERE biblio_id = ? AND position_ligne = ?
+                """,
+                (biblio_id, ligne),
+            ).fetchall()
+        return {
+            col: {
+                "crop_hash": int(crop_hash, 16),
+                "width": width,
+                "height": height,
+                "ocr_result": _load_ocr(json.loads(ocr_result)) if ocr_result else None,
+                "livre_id": livre_id,
+                "agent_result": json.loads(agent_result),
+            }
+            for col, crop_hash, width, height, ocr_result, livre_id, agent_result in rows
+        }
+
+    def save(self, biblio_id: int, ligne: int, entries: dict) -> None:
+        """
+        Store one shelf row
+        entries: {position_colonne: {"crop_hash", "width", "height", "ocr_result", "livre_id", "agent_result"}}
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT OR REPLACE INTO shelf_positions
+                  (biblio_id, position_ligne, position_colonne, crop_hash, width, height,
+                   ocr_result, livre_id, agent_result, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        biblio_id, ligne, col, f"{e['crop_hash']:x}", e["width"], e["height"],
+                        json.dumps(_dump_ocr(e["ocr_result"])), e["livre_id"],
+                        json.dumps(e["agent_result"]), now,
+                    )
+                    for col, e in entries.items()
+                ],
+            )
+            self._conn.commit()
+
+    def delete(self, biblio_id: int, ligne: int, cols) -> None:
+        """Forget the given positions of one shelf row"""
+        with self._lock:
+            self._conn.executemany(
+                """
+                DELETE FROM shelf_positions
+                WHERE biblio_id = ? AND position_ligne = ? AND position_colonne = ?
+                """,
+                [(biblio_id, ligne, col) for col in cols],
+            )
+            self._conn.commit()
+
+
+def _same_geometry(entry, width, height, tolerance):
+    if not entry.get("width") or not entry.get("height"):
+        return False
+    return (abs(entry["width"] - width) <= tolerance * max(entry["width"], width)
+            and abs(entry["height"] - height) <= tolerance * max(entry["height"], height))
+
+
+def _spine_cost(entry, crop_hash, size):
+    """Alignment cost of pairing a stored spine with a new crop (None = different book)"""
+    distance = hamming_distance(entry["crop_hash"], crop_hash)
+    if distance > config.SHELF_UNCHANGED_MAX_DISTANCE:
+        return None
+    if entry.get("width") and not _same_geometry(entry, *size, config.SPINE_GEOMETRY_TOLERANCE):
+        return None
+    return distance
+
+
+def match_spines(stored: dict, crop_hashes: list, sizes: list) -> dict:
+    """
+    Match the crops of a new scan against the stored spines of the same row
+
+    A crop matches a stored spine when their dHash distance is within
+    config.SHELF_UNCHANGED_MAX_DISTANCE and their box sizes within
+    config.SPINE_GEOMETRY_TOLERANCE. Both sequences are aligned in shelf
+    order (Needleman-Wunsch, a gap costs more than any match), so inserted
+    or removed books only shift their neighbours; crops left over are then
+    matched against the spines left over (books swapped around).
+
+    Returns: {idx: stored entry + "position_colonne"}
+    """
+    cols = sorted(stored)
+    n, m = len(cols), len(crop_hashes)
+    gap = config.SHELF_UNCHANGED_MAX_DISTANCE + 1
+    costs = [[_spine_cost(stored[col], h, size) for h, size in zip(crop_hashes, sizes)] for col in cols]
+
+    # score[i][j]: best cost aligning the first i stored spines with the first j crops
+    score = [[(i + j) * gap for j in range(m + 1)] for i in range(n + 1)]
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            best = min(score[i - 1][j], score[i][j - 1]) + gap
+            if costs[i - 1][j - 1] is not None:
+                best = min(best, score[i - 1][j - 1] + costs[i - 1][j - 1])
+            score[i][j] = best
+
+    matches = {}
+    i, j = n, m
+    while i > 0 and j > 0:
+        cost = costs[i - 1][j - 1]
+        if cost is not None and score[i][j] == score[i - 1][j - 1] + cost:
+            matches[j - 1] = cols[i - 1]
+            i, j = i - 1, j - 1
+        elif score[i][j] == score[i - 1][j] + gap:
+            i -= 1
+        else:
+            j -= 1
+
+    # Leftovers: closest unused spine anywhere on the row
+    used = set(matches.values())
+    for j in range(m):
+        if j in matches:
+            continue
+        candidates = [(costs[i][j], cols[i]) for i in range(n)
+                      if cols[i] not in used and costs[i][j] is not None]
+        if candidates:
+            matches[j] = min(candidates)[1]
+            used.add(matches[j])
+
+    return {idx: dict(stored[col], position_colonne=col) for idx, col in sorted(matches.items())}
+
+
+# Global shelf state instance
+shelf_state = ShelfStateStore()
@@ -0,0 +1,57 @@
+"""Per-request debug artifacts (crops, annotated images)"""
+import os
+import sys
+import uuid
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+
+def new_request_id():
+    """Unique ID used to namespace the artifacts of one request"""
+    return uuid.uuid4().hex[:16]
+
+
+def artifact_path(request_id, name):
+    """Filesystem path of an artifact (creates the request directory)"""
+    directory = os.path.join(config.DEBUG_CROPS_DIR, request_id)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+def artifact_url(request_id, name):
+    """URL under which an artifact is served (None for a request without artifacts)"""
+    if request_id is None:
+        return None
+    return f"/debug_crops/{request_id}/{name}"
+
+
+def resolve_artifact(filename):
+    """Map a /debug_crops/ sub-path to a file, refusing paths outside DEBUG_CROPS_DIR"""
+    root = os.path.realpath(config.DEBUG_CROPS_DIR)
+    path = os.path.realpath(os.path.join(root, filename))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        return None
+    return path
+
+
+def prune_old_requests(keep=None):
+    """Delete the artifact directories of all but the `keep` most recent requests"""
+    keep = config.DEBUG_MAX_REQUESTS if keep is None else keep
+    root = config.DEBUG_CROPS_DIR
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        return
+    entries = []
+    for name in names:
+        path = os.path.join(root, name)
+        try:
+            if os.path.isdir(path):
+                entries.append((os.path.getmtime(path), path))
+        except OSError:
+            continue  # removed meanwhile (another worker pruning)
+    entries.sort(reverse=True)
+    for _, path in entries[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,170 @@
+"""Image utility functions"""
+import cv2
+import numpy as np
+
+
+def crop_text_region(image, poly):
+    """Crop a (possibly rotated) text region given its 4-point polygon"""
+    points = np.asarray(poly, dtype=np.float32).reshape(4, 2)
+    width = int(max(np.linalg.norm(points[0] - points[1]),
+                    np.linalg.norm(points[2] - points[3])))
+    height = int(max(np.linalg.norm(points[0] - points[3]),
+                     np.linalg.norm(points[1] - points[2])))
+    width, height = max(width, 1), max(height, 1)
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    matrix = cv2.getPerspectiveTransform(points, target)
+    region = cv2.warpPerspective(
+        image, matrix, (width, height),
+        borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC
+    )
+    # Vertical text line: rotate so the recognizer reads it horizontally
+    if height / width >= 1.5:
+        region = np.rot90(region)
+    return region
+
+
+def spine_rotation(image, direction="bottom_to_top", min_aspect=1.5):
+    """
+    Quarter turns (np.rot90 k) bringing the title of a book crop to horizontal reading
+
+    A crop at least `min_aspect` times taller than wide is a standing spine
+    whose title runs along its length: "bottom_to_top" text is turned a
+    quarter clockwise, "top_to_bottom" text counter-clockwise. Other crops
+    (books lying flat, covers) are left as they are.
+    """
+    height, width = image.shape[:2]
+    if height < min_aspect * width:
+        return 0
+    return 1 if direction == "top_to_bottom" else -1
+
+
+def unrotate_points(points, k, shape):
+    """Map points of np.rot90(image, k) back to `image` (shape: its original (height, width))"""
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+    height, width = shape[:2]
+    u, v = points[:, 0], points[:, 1]
+    if k % 4 == 1:
+        return np.stack([width - 1 - v, u], axis=1)
+    if k % 4 == 3:
+        return np.stack([v, height - 1 - u], axis=1)
+    if k % 4 == 2:
+        return np.stack([width - 1 - u, height - 1 - v], axis=1)
+    return points
+
+
+def sort_text_boxes(boxes):
+    """Sort text boxes top-to-bottom, then left-to-right (reading order)"""
+    return sorted(boxes, key=lambda b: (round(float(b[0][1]) / 10), float(b[0][0])))
+
+
+def box_iou(a, b):
+    """Intersection over union of two [x1, y1, x2, y2] boxes"""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return float(inter / union) if union > 0 else 0.0
+
+
+def dhash(image, size=8):
+    """Difference hash of an image (size*size bits), robust to re-encoding and small shifts"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two integer hashes"""
+    return bin(a ^ b).count("1")
+
+
+def ocr_skip_reason(image, min_side, max_aspect, min_sharpness, min_edge_density, work_size=256):
+    """
+    Why a book crop is not worth an OCR pass, or None
+
+    "empty" / "too_small" (shortest side under `min_side` px) / "sliver"
+    (longer than `max_aspect` times its width), then, on a gray copy
+    downscaled to `work_size` px: "blank" (Canny edge density under
+    `min_edge_density`) and "blurry" (variance of the Laplacian under
+    `min_sharpness`).
+    """
+    if image is None or image.size == 0:
+        return "empty"
+    height, width = image.shape[:2]
+    if min(height, width) < min_side:
+        return "too_small"
+    if max(height, width) > max_aspect * min(height, width):
+        return "sliver"
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    scale = work_size / max(height, width)
+    if scale < 1:
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        gray = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+    # Low Canny thresholds: dull spines have faint edges, a blank crop has none
+    if np.count_nonzero(cv2.Canny(gray, 20, 60)) / gray.size < min_edge_density:
+        return "blank"
+    if cv2.Laplacian(gray, cv2.CV_64F).var() < min_sharpness:
+        return "blurry"
+    return None
+
+
+def tile_grid(width, height, min_tile, overlap, max_tiles):
+    """
+    Overlapping tiles [x1, y1, x2, y2] along the long axis of a width x height image
+
+    Tiles span the whole short side and are about as long as it (at least
+    `min_tile` px), so a book spine is never cut lengthwise; neighbours
+    overlap by `overlap` (fraction of the tile). The tile count follows
+    from the aspect ratio; past `max_tiles` the tiles get longer instead.
+    """
+    long_side, short_side = max(width, height), min(width, height)
+    size = min(long_side, max(short_side, min_tile))
+    count = 1 if size >= long_side else int(np.ceil((long_side - size) / (size * (1 - overlap)))) + 1
+    if count > max_tiles:
+        count = max_tiles
+        size = int(np.ceil(long_side / (1 + (count - 1) * (1 - overlap))))
+    starts = [int(round(s)) for s in np.linspace(0, long_side - size, count)]
+    if width >= height:
+        return [[s, 0, s + size, height] for s in starts]
+    return [[0, s, width, s + size] for s in starts]
+
+
+def box_overlaps(boxes, metric="iou"):
+    """
+    Pairwise overlap matrix of N [x1, y1, x2, y2] boxes
+    metric "iou": intersection over union, "ios": intersection over the smaller box
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    top_left = np.maximum(boxes[:, None, :2], boxes[None, :, :2])
+    bottom_right = np.minimum(boxes[:, None, 2:], boxes[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    if metric == "ios":
+        denominator = np.minimum(areas[:, None], areas[None, :])
+    else:
+        denominator = areas[:, None] + areas[None, :] - inter
+    return np.divide(inter, denominator, out=np.zeros_like(inter), where=denominator > 0)
+
+
+def nms(boxes, scores, threshold, classes=None, metric="iou"):
+    """
+    Non-maximum suppression: indices of the boxes kept, best score first
+
+    The overlap matrix is computed once; each kept box then suppresses all
+    lower-scored boxes above `threshold` in one vectorized step. With
+    `classes`, boxes of different classes never suppress each other.
+    """
+    order = np.argsort(-np.asarray(scores), kind="stable")
+    overlaps = box_overlaps(np.asarray(boxes)[order], metric)
+    if classes is not None:
+        classes = np.asarray(classes)[order]
+        overlaps = np.where(classes[:, None] == classes[None, :], overlaps, 0)
+    suppressed = np.zeros(len(order), dtype=bool)
+    keep = []
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        keep.append(order[i])
+        suppressed[i + 1:] |= overlaps[i, i + 1:] > threshold
+    return np.array(keep, dtype=np.int64)
@@ -1,4 +1,6 @@
 """OCR utility functions"""
+import unicodedata
+
 def clean_text(ocr_result):
     """Clean and format OCR text from PaddleOCR result"""
     if not ocr_result or 'rec_texts' not in ocr_result:
@@ -31,3 +33,27 @@ def get_confidence_label(confidence):
     else:
         return "Poor"
 
+def normalize_text(text):
+    """Normalize OCR text for matching (case, accents, punctuation, spaces)"""
+    text = unicodedata.normalize("NFKD", text or "").casefold()
+    # OCR often drops accents: compare on base letters
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    # Keep letters/digits (accents included), drop punctuation noise
+    text = "".join(ch if ch.isalnum() else " " for ch in text)
+    return " ".join(text.split())
+
+def levenshtein_distance(a, b):
+    """Edit distance (insertions, deletions, substitutions) between two strings"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb),
+            ))
+        previous = current
+    return previous[-1]
@@ -0,0 +1,90 @@
+"""Crop preprocessing shared by the OCR backends: upright, fixed height, color mode, padded batch"""
+import cv2
+import numpy as np
+
+from utils.image_utils import spine_rotation, unrotate_points
+
+COLOR_MODES = ("bgr", "gray", "clahe")
+
+# BGR -> luma weights (same as cv2.COLOR_BGR2GRAY)
+_GRAY_WEIGHTS = np.array([0.114, 0.587, 0.299], dtype=np.float32)
+
+
+class CropBatch:
+    """
+    Preprocessed crops packed in one contiguous, zero-padded uint8 array
+
+    images: (N, height, max_width, 3); crop i is images[i, :heights[i], :widths[i]]
+    (a view, no copy). `to_original` maps points of a preprocessed crop
+    back to the frame of the crop it came from.
+    """
+
+    def __init__(self, images, widths, heights, transforms):
+        self.images = images
+        self.widths = widths
+        self.heights = heights
+        self._transforms = transforms   # (quarter turns, x scale, y scale, original shape) or None
+
+    def __len__(self):
+        return len(self._transforms)
+
+    def crop(self, idx):
+        """Preprocessed crop idx (None for an empty input crop)"""
+        if self._transforms[idx] is None:
+            return None
+        return self.images[idx, :self.heights[idx], :self.widths[idx]]
+
+    def to_original(self, idx, points):
+        k, scale_x, scale_y, shape = self._transforms[idx]
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2) / np.array([scale_x, scale_y], dtype=np.float32)
+        return unrotate_points(points, k, shape)
+
+
+def prepare_crops(crops, height=None, color="bgr", direction="bottom_to_top"):
+    """
+    Preprocess book crops for OCR as one CropBatch
+
+    Each crop is turned to horizontal reading (spine_rotation) and resized
+    to `height` px, keeping its aspect ratio; a 12 MP upload no longer
+    feeds multi-megapixel crops to the text detector. Crops are then packed
+    in a padded batch, where "gray" / "clahe" are applied (grayscale on the
+    whole batch at once; CLAHE per crop) and kept as 3 identical channels.
+    """
+    if color not in COLOR_MODES:
+        raise ValueError(f"Unknown crop color mode {color!r}, expected one of {COLOR_MODES}")
+    upright, transforms = [], []
+    for crop in crops:
+        if crop is None or crop.size == 0:
+            upright.append(None)
+            transforms.append(None)
+            continue
+        if crop.ndim == 2:
+            crop = cv2.cvtColor(crop, cv2.COLOR_GRAY2BGR)
+        k = spine_rotation(crop, direction)
+        rotated = np.rot90(crop, k) if k else crop
+        scale_x = scale_y = 1.0
+        if height:
+            new_width = max(1, int(round(rotated.shape[1] * height / rotated.shape[0])))
+            scale_x, scale_y = new_width / rotated.shape[1], height / rotated.shape[0]
+            interpolation = cv2.INTER_AREA if scale_y < 1 else cv2.INTER_LINEAR
+            rotated = cv2.resize(np.ascontiguousarray(rotated), (new_width, height), interpolation=interpolation)
+        upright.append(rotated)
+        transforms.append((k, scale_x, scale_y, crop.shape))
+
+    heights = np.array([0 if u is None else u.shape[0] for u in upright], dtype=np.int32)
+    widths = np.array([0 if u is None else u.shape[1] for u in upright], dtype=np.int32)
+    images = np.zeros((len(upright), int(heights.max(initial=1)), int(widths.max(initial=1)), 3), dtype=np.uint8)
+    for idx, image in enumerate(upright):
+        if image is not None:
+            images[idx, :image.shape[0], :image.shape[1]] = image
+
+    if color != "bgr":
+        gray = (images.astype(np.float32) @ _GRAY_WEIGHTS).round().astype(np.uint8)
+        if color == "clahe":
+            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+            for idx in np.flatnonzero(widths):
+                gray[idx, :heights[idx], :widths[idx]] = clahe.apply(
+                    np.ascontiguousarray(gray[idx, :heights[idx], :widths[idx]])
+                )
+        images = np.repeat(gray[..., None], 3, axis=3)
+    return CropBatch(images, widths, heights, transforms)